@@ -0,0 +1,96 @@
+"""store refresh tokens as SHA-256 digests with an expiry
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Existing rows are backfilled in batches: the raw token is hashed and
+expires_at is set to created_at + REFRESH_TOKEN_EXPIRE_DAYS, so sessions
+issued before the upgrade keep working. The raw token column is dropped.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+refresh_tokens = sa.table(
+    "refresh_tokens",
+    sa.column("id", sa.Integer),
+    sa.column("token", sa.String),
+    sa.column("token_hash", sa.String),
+    sa.column("created_at", sa.DateTime(timezone=True)),
+    sa.column("expires_at", sa.DateTime(timezone=True)),
+    sa.column("revoked", sa.Boolean),
+)
+
+
+def upgrade() -> None:
+    op.add_column("refresh_tokens", sa.Column("token_hash", sa.String(length=64), nullable=True))
+    op.add_column("refresh_tokens", sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True))
+
+    conn = op.get_bind()
+    lifetime = timedelta(days=settings.refresh_token_expire_days)
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(refresh_tokens.c.id, refresh_tokens.c.token, refresh_tokens.c.created_at)
+            .where(refresh_tokens.c.id > last_id)
+            .order_by(refresh_tokens.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            refresh_tokens.update()
+            .where(refresh_tokens.c.id == sa.bindparam("row_id"))
+            .values(token_hash=sa.bindparam("new_hash"), expires_at=sa.bindparam("new_expiry")),
+            [
+                {
+                    "row_id": row.id,
+                    "new_hash": hashlib.sha256(row.token.encode()).hexdigest(),
+                    "new_expiry": (row.created_at or datetime.now(timezone.utc)) + lifetime,
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table("refresh_tokens") as batch_op:
+        batch_op.alter_column("token_hash", existing_type=sa.String(length=64), nullable=False)
+        batch_op.alter_column("expires_at", existing_type=sa.DateTime(timezone=True), nullable=False)
+        batch_op.drop_column("token")
+        batch_op.create_unique_constraint("uq_refresh_tokens_token_hash", ["token_hash"])
+
+    op.create_index("ix_refresh_tokens_expires_at", "refresh_tokens", ["expires_at"])
+    op.create_index(
+        "ix_refresh_tokens_active_hash",
+        "refresh_tokens",
+        ["token_hash"],
+        postgresql_where=sa.text("NOT revoked"),
+        sqlite_where=sa.text("revoked = 0"),
+    )
+
+
+def downgrade() -> None:
+    # Raw tokens cannot be recovered: every session is revoked on downgrade.
+    op.drop_index("ix_refresh_tokens_active_hash", table_name="refresh_tokens")
+    op.drop_index("ix_refresh_tokens_expires_at", table_name="refresh_tokens")
+    op.add_column("refresh_tokens", sa.Column("token", sa.String(), nullable=True))
+    op.execute(refresh_tokens.update().values(token=refresh_tokens.c.token_hash, revoked=True))
+    with op.batch_alter_table("refresh_tokens") as batch_op:
+        batch_op.drop_constraint("uq_refresh_tokens_token_hash", type_="unique")
+        batch_op.alter_column("token", existing_type=sa.String(), nullable=False)
+        batch_op.create_unique_constraint("uq_refresh_tokens_token", ["token"])
+        batch_op.drop_column("expires_at")
+        batch_op.drop_column("token_hash")
@@ -0,0 +1,44 @@
+"""add users.phone_e164
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.phone import to_e164
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("phone_e164", sa.String(length=16), nullable=True))
+    op.create_index("ix_users_phone_e164", "users", ["phone_e164"])
+
+    # Backfill in id batches
+    users = sa.table("users", sa.column("id", sa.Integer), sa.column("phone", sa.String), sa.column("phone_e164", sa.String))
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(users.c.id, users.c.phone).where(users.c.id > last_id).order_by(users.c.id).limit(1000)
+        ).all()
+        if not rows:
+            break
+        for user_id, phone in rows:
+            canonical = to_e164(phone)
+            if canonical is not None:
+                bind.execute(users.update().where(users.c.id == user_id).values(phone_e164=canonical))
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_phone_e164", table_name="users")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("phone_e164")
@@ -0,0 +1,31 @@
+"""add users.updated_at
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # SQLite can't add a column with a non-constant default, so the default
+    # is set after the backfill (batch mode recreates the table there)
+    op.add_column("users", sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE users SET updated_at = created_at")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(timezone=True), server_default=sa.func.now())
+    op.create_index("ix_users_updated_at", "users", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_updated_at", table_name="users")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("updated_at")
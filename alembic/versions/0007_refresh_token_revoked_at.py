@@ -0,0 +1,48 @@
+"""add refresh_tokens.revoked_at; drop the partial active-hash index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Rows revoked before the upgrade have no revocation time; they are stamped
+with the upgrade time so they stay for the full retention window. The
+partial index on token_hash duplicated the unique one and is dropped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+refresh_tokens = sa.table(
+    "refresh_tokens",
+    sa.column("revoked", sa.Boolean),
+    sa.column("revoked_at", sa.DateTime(timezone=True)),
+)
+
+
+def upgrade() -> None:
+    op.add_column("refresh_tokens", sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute(
+        refresh_tokens.update()
+        .where(refresh_tokens.c.revoked == sa.true())
+        .values(revoked_at=sa.func.current_timestamp())
+    )
+    op.create_index("ix_refresh_tokens_revoked_at", "refresh_tokens", ["revoked_at"])
+    op.drop_index("ix_refresh_tokens_active_hash", table_name="refresh_tokens")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_refresh_tokens_active_hash",
+        "refresh_tokens",
+        ["token_hash"],
+        postgresql_where=sa.text("NOT revoked"),
+        sqlite_where=sa.text("revoked = 0"),
+    )
+    op.drop_index("ix_refresh_tokens_revoked_at", table_name="refresh_tokens")
+    with op.batch_alter_table("refresh_tokens") as batch_op:
+        batch_op.drop_column("revoked_at")
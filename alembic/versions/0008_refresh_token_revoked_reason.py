@@ -0,0 +1,27 @@
+"""add refresh_tokens.revoked_reason
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+Only replaying a token revoked by rotation revokes the user's other
+sessions. Rows revoked before the upgrade have no reason and are treated as
+plain invalid tokens.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("refresh_tokens", sa.Column("revoked_reason", sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("refresh_tokens") as batch_op:
+        batch_op.drop_column("revoked_reason")
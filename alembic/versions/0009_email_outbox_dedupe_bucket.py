@@ -0,0 +1,29 @@
+"""enforce email dedupe with a unique (dedupe_key, dedupe_bucket) index
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+Rows queued before the upgrade have no bucket and never conflict.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("email_outbox", sa.Column("dedupe_bucket", sa.Integer(), nullable=True))
+    op.drop_index("ix_email_outbox_dedupe_key", table_name="email_outbox")
+    op.create_index("uq_email_outbox_dedupe", "email_outbox", ["dedupe_key", "dedupe_bucket"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("uq_email_outbox_dedupe", table_name="email_outbox")
+    op.create_index("ix_email_outbox_dedupe_key", "email_outbox", ["dedupe_key"])
+    with op.batch_alter_table("email_outbox") as batch_op:
+        batch_op.drop_column("dedupe_bucket")
@@ -1,31 +1,111 @@
 # app/api/deps.py
 
+from dataclasses import dataclass
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.security import decode_access_token
+from app.core.revocation import check_revoked
 from app.core.config import settings
-from app.db.session import get_session
-from app.db.crud_user import get_user_by_email
+from app.db.session import get_session, run_on_replica
+from app.db.crud_user import get_user_by_email, get_user_by_id
 from app.db.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
+_PRINCIPAL_CLAIMS = ("uid", "act", "tfa", "ver")
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    session: AsyncSession = Depends(get_session)
-) -> User:
-    payload = decode_access_token(token)
-    if payload is None or "sub" not in payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    id: int
+    email: str
+    is_active: bool
+    is_2fa_enabled: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            is_2fa_enabled=user.is_2fa_enabled,
+            token_version=user.token_version or 0,
         )
 
+
+def _invalid_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    payload = decode_access_token(token)
+    # Revoked jtis and outdated token versions are rejected from memory,
+    # before any user lookup
+    if payload is None or "sub" not in payload or check_revoked(payload):
+        raise _invalid_token()
+    return payload
+
+
+def get_optional_token_payload(token: str | None = Depends(optional_oauth2_scheme)) -> dict | None:
+    payload = decode_access_token(token) if token else None
+    return payload if payload is not None and "sub" in payload else None
+
+
+async def _load_user(session: AsyncSession, payload: dict) -> User:
     user = await get_user_by_email(session, payload["sub"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if "ver" in payload and payload["ver"] != (user.token_version or 0):
+        raise _invalid_token()
+    return user
+
+
+def stateless_principal(payload: dict) -> Principal | None:
+    # Stateless mode: the signed claims are enough, no SQL runs. None when
+    # disabled or for older tokens without the claims.
+    if settings.stateless_auth and all(claim in payload for claim in _PRINCIPAL_CLAIMS):
+        return Principal(
+            id=payload["uid"],
+            email=payload["sub"],
+            is_active=payload["act"],
+            is_2fa_enabled=payload["tfa"],
+            token_version=payload["ver"],
+        )
+    return None
+
+
+async def get_current_principal(
+    payload: dict = Depends(get_token_payload),
+    session: AsyncSession = Depends(get_session),
+) -> Principal:
+    return stateless_principal(payload) or Principal.from_user(await _load_user(session, payload))
 
+
+async def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    principal: Principal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_session),
+) -> User:
+    # The principal lookup above already put the user in this session's
+    # identity map when not stateless, so this only reaches the cache or the
+    # database in stateless mode.
+    user = await get_user_by_id(session, principal.id)
+    if user is None or user.email != principal.email:
+        raise HTTPException(status_code=404, detail="User not found")
+    if "ver" in payload and payload["ver"] != (user.token_version or 0):
+        raise _invalid_token()
     return user
+
+
+async def get_current_user_readonly(payload: dict = Depends(get_token_payload)) -> User:
+    # For read-only routes: loaded on a read replica when one is configured
+    # (primary otherwise) and detached from any session, so don't modify it.
+    return await run_on_replica(lambda session: _load_user(session, payload), user_id=payload.get("uid"))
@@ -0,0 +1,169 @@
+# app/api/responses.py
+
+# Fast JSON responses. ORJSONResponse is the app's default response class.
+# Handlers that already hold a validated model return model_response(), which
+# serializes it with pydantic-core directly and so skips FastAPI's second
+# validation pass over response_model. Serialization time is added to the
+# per-request ResponseStats that the middleware in app.main records, and
+# recorded as a "render" span on the request trace.
+#
+# GET /users/me is polled on every SPA navigation, so its body is built
+# straight from the user row (no per-request phonenumbers parsing or model
+# validation), optionally cached per user, and served with an ETag so
+# unchanged profiles come back as 304.
+
+import contextvars
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.invalidation import bus
+from app.core.metrics import Counter, Histogram
+from app.core.phone import to_e164
+from app.core.tracing import record_span
+from app.db.models import User
+
+me_cache = Counter("auth_me_cache_total", "Serialized /users/me body cache lookups by result")
+response_bytes = Histogram(
+    "auth_response_bytes", "Response body size by route",
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144),
+)
+response_serialize_seconds = Histogram("auth_response_serialize_seconds", "Time spent serializing response bodies, by route")
+
+
+@dataclass
+class ResponseStats:
+    serialize_seconds: float = 0.0
+
+
+# Set per request by the middleware in app.main
+response_stats: contextvars.ContextVar[ResponseStats | None] = contextvars.ContextVar("response_stats", default=None)
+
+
+def _add_serialize_time(started: float) -> None:
+    elapsed = time.perf_counter() - started
+    stats = response_stats.get()
+    if stats is not None:
+        stats.serialize_seconds += elapsed
+    record_span("render", started, elapsed)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        _add_serialize_time(started)
+        return body
+
+
+def model_response(model: BaseModel, status_code: int = 200, headers: dict | None = None) -> Response:
+    # The model was validated when it was built; dump it straight to JSON
+    started = time.perf_counter()
+    body = model.__pydantic_serializer__.to_json(model)
+    _add_serialize_time(started)
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+# Shown for legacy rows whose phone can't be parsed (as before)
+FALLBACK_PHONE = "+989000000000"
+
+
+def user_out_body(user: User) -> bytes:
+    # Same fields as schemas.UserOut; phone is the stored E.164 form
+    started = time.perf_counter()
+    body = orjson.dumps({
+        "id": user.id,
+        "email": user.email,
+        "fname": user.fname,
+        "lname": user.lname,
+        "phone": user.phone_e164 or to_e164(user.phone) or FALLBACK_PHONE,
+        "is_active": user.is_active,
+        "is_2fa_enabled": user.is_2fa_enabled,
+    })
+    _add_serialize_time(started)
+    return body
+
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class BodyCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, bytes, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: int) -> tuple[bytes, str] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key: int, body: bytes, etag: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: int | None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+me_bodies = BodyCache(maxsize=settings.me_cache_size, ttl=settings.me_cache_ttl_seconds)
+
+
+def _on_user_changed(payload: dict) -> None:
+    # Committed user changes are published on the user cache's channel; an
+    # empty payload means "everything"
+    if payload.get("id") is not None or payload.get("email") is None:
+        me_bodies.invalidate(payload.get("id"))
+
+
+bus.subscribe("user", _on_user_changed)
+
+
+def _etag_response(request: Request, body: bytes, etag: str) -> Response:
+    # Clients may keep the body but must revalidate every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached_user_out_response(request: Request, user_id: int) -> Response | None:
+    # From the cache alone, so the caller can skip loading the user
+    cached = me_bodies.get(user_id) if settings.me_cache_enabled else None
+    if cached is None:
+        return None
+    me_cache.inc(result="hit")
+    return _etag_response(request, *cached)
+
+
+def user_out_response(request: Request, user: User, use_cache: bool = False) -> Response:
+    if use_cache:
+        cached = cached_user_out_response(request, user.id)
+        if cached is not None:
+            return cached
+    body = user_out_body(user)
+    etag = body_etag(body)
+    if use_cache and settings.me_cache_enabled:
+        me_cache.inc(result="miss")
+        me_bodies.put(user.id, body, etag)
+    return _etag_response(request, body, etag)
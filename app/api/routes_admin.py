@@ -0,0 +1,38 @@
+# app/api/routes_admin.py
+
+import secrets
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+
+from app.core.config import settings
+from app.core.hashing import hashing_pool
+from app.db.provisioning import UserImporter, iter_records
+
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_api_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/users/import")
+async def import_users(
+    request: Request,
+    format: Literal["csv", "jsonl"] = "jsonl",
+    verified: bool = False,
+):
+    # The request body is the raw CSV / JSON lines file and is streamed
+    # through the importer batch by batch; existing emails are skipped, so a
+    # failed upload can simply be sent again. Hashing shares the server's
+    # pool; forking a process pool per request from a threaded server risks
+    # deadlocks.
+    importer = UserImporter(
+        batch_size=settings.user_import_batch_size,
+        verified=verified,
+        pool=hashing_pool,
+    )
+    stats = await importer.run(iter_records(request.stream(), format))
+    return stats.as_dict()
@@ -1,16 +1,20 @@
 # app/api/routes_auth.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Form
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2
+from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from app.api.schemas import UserCreate, Token, TokenRefreshRequest, ForgotPasswordRequest, ResetPasswordRequest
-from app.db.crud_user import get_user_by_email, create_user, create_refresh_token, revoke_refresh_token
+from app.db.crud_user import get_user_by_email, create_user, create_refresh_token, rotate_refresh_token, RefreshTokenReused
 from app.db.session import get_session
-from app.core.security import verify_password, create_access_token, validate_refresh_token, issue_access_token_from_refresh, generate_password_reset_token, verify_password_reset_token, send_email, hash_password, generate_email_verification_token, verify_email_verification_token
+from app.db.crud_email import queue_email
+from app.core.security import verify_and_update_password_async, verify_missing_user, create_user_access_token, generate_password_reset_token, verify_password_reset_token, hash_password_async, generate_email_verification_token, verify_email_verification_token
 from app.core.config import settings
-import pyotp
+from app.core.ratelimit import login_limiter, client_ip
+from app.core.totp import totp_verifier
+from app.api.responses import model_response
+from app.db.known_emails import known_emails
 from pydantic import BaseModel
 
 
@@ -37,32 +41,65 @@ class OAuth2PasswordRequestFormWith2FA(OAuth2PasswordRequestForm):
         self.two_fa_code = two_fa_code
 
 
+async def queue_verification_email(session: AsyncSession, user) -> bool:
+    # Repeated logins by an unverified user get the same link (the token is
+    # stable within its window) and the mail is deduplicated per user
+    token = generate_email_verification_token(user.email)
+    verify_link = f"{settings.frontend_url}/auth/verify-email?token={token}"
+    return await queue_email(
+        session,
+        to_email=user.email,
+        subject="Verify your email",
+        body=f"<p>Click <a href='{verify_link}'>here</a> to verify your email address. This link will expire in 24 hours.</p>",
+        dedupe_key=f"verify-email:{user.id}",
+    )
+
+
+def unverified_detail(sent: bool) -> str:
+    if sent:
+        return "Please verify your email before logging in. A new verification email has been sent."
+    return "Please verify your email before logging in. A verification email was sent recently; check your inbox."
+
+
+async def authenticate(session: AsyncSession, ip: str, username: str, password: str):
+    # Returns the user or None. Unknown accounts cost the same time as a wrong
+    # password (see verify_missing_user) and, when the known-email filter
+    # rules them out, no users lookup either.
+    await login_limiter.check(ip, username)
+    user = await get_user_by_email(session, username) if known_emails.might_exist(username) else None
+    # Don't hold a pooled connection while bcrypt runs
+    await session.release()
+    if user is None:
+        await verify_missing_user(password, spend_cpu=await login_limiter.allow_dummy_verify())
+    else:
+        valid, new_hash = await verify_and_update_password_async(password, user.hashed_pw)
+        if valid:
+            if new_hash is not None and settings.password_rehash_on_login:
+                # Upgraded to the current profile; committed with the login
+                user.hashed_pw = new_hash
+            return user
+    await login_limiter.record_failure(ip, username)
+    return None
+
+
 @router.post("/register", response_model=Token, status_code=201)
 async def register(user_in: UserCreate, session: AsyncSession = Depends(get_session)):
     existing = await get_user_by_email(session, user_in.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Set is_verified to False on registration
-    user = await create_user(session, email=user_in.email, password=user_in.password, fname=user_in.fname, lname=user_in.lname, phone=user_in.phone)
-    user.is_verified = False
-    session.add(user)
-    await session.commit()
-    await session.refresh(user)
+    # Don't hold a pooled connection while the password is hashed
+    await session.release()
 
-    # Generate and send verification email
-    token = generate_email_verification_token(user.email)
-    verify_link = f"{settings.frontend_url}/auth/verify-email?token={token}"
-    send_email(
-        to_email=user.email,
-        subject="Verify your email",
-        body=f"<p>Click <a href='{verify_link}'>here</a> to verify your email address. This link will expire in 24 hours.</p>"
-    )
+    # User, verification email and refresh token are written in one transaction
+    user = await create_user(session, email=user_in.email, password=user_in.password, fname=user_in.fname, lname=user_in.lname, phone=user_in.phone, is_verified=False)
+    await queue_verification_email(session, user)
+    refresh_token_obj = await create_refresh_token(session, user_id=user.id)
+    await session.commit()
 
     # Optionally, do not return tokens until verified, or return with a warning
-    access_token = create_access_token(data={"sub": user.email})
-    refresh_token_obj = await create_refresh_token(session, user_id=user.id)
-    return {"access_token": access_token, "refresh_token": refresh_token_obj.token, "token_type": "bearer"}
+    access_token = create_user_access_token(user)
+    return model_response(Token(access_token=access_token, refresh_token=refresh_token_obj.token), status_code=201)
 
 
 @router.get("/verify-email")
@@ -87,24 +124,18 @@ Standard OAuth2 password login.\n\n**If 2FA is enabled for your account, enter y
 """
 )
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestFormWith2FA = Depends(),
     session: AsyncSession = Depends(get_session),
 ):
-    user = await get_user_by_email(session, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_pw):
+    ip = client_ip(request)
+    user = await authenticate(session, ip, form_data.username, form_data.password)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     if not user.is_verified:
-        token = generate_email_verification_token(user.email)
-        verify_link = f"{settings.frontend_url}/auth/verify-email?token={token}"
-        send_email(
-            to_email=user.email,
-            subject="Verify your email",
-            body=f"<p>Click <a href='{verify_link}'>here</a> to verify your email address. This link will expire in 24 hours.</p>"
-        )
-        raise HTTPException(
-            status_code=403,
-            detail="Please verify your email before logging in. A new verification email has been sent."
-        )
+        sent = await queue_verification_email(session, user)
+        await session.commit()
+        raise HTTPException(status_code=403, detail=unverified_detail(sent))
     if user.is_2fa_enabled:
         # Use client_secret as the 2FA code for Swagger UI compatibility
         two_fa_code = form_data.client_secret
@@ -112,31 +143,28 @@ async def login(
             raise HTTPException(status_code=401, detail="2FA code required. Enter your 2FA code in the client_secret field.")
         if user.totp_secret is None:
             raise HTTPException(status_code=500, detail="2FA is enabled but no TOTP secret is set for this user.")
-        import pyotp
-        totp = pyotp.TOTP(user.totp_secret)
-        if not totp.verify(two_fa_code):
+        if not await totp_verifier.verify(user.id, user.totp_secret, two_fa_code):
+            await login_limiter.record_failure(ip, form_data.username)
             raise HTTPException(status_code=401, detail="Invalid 2FA code.")
-    token = create_access_token(data={"sub": user.email})
+    await login_limiter.record_success(ip, form_data.username)
+    token = create_user_access_token(user)
+    # Commits the refresh token together with a rehashed password, if any
     refresh_token_obj = await create_refresh_token(session, user_id=user.id)
-    return {"access_token": token, "refresh_token": refresh_token_obj.token, "token_type": "bearer"}
+    await session.commit()
+    return model_response(Token(access_token=token, refresh_token=refresh_token_obj.token))
 
 
 @router.post("/refresh", response_model=Token)
 async def refresh_token(request: TokenRefreshRequest, session: AsyncSession = Depends(get_session)):
-    new_access_token = await issue_access_token_from_refresh(session, request.refresh_token)
-    if not new_access_token:
+    try:
+        rotated = await rotate_refresh_token(session, request.refresh_token)
+    except RefreshTokenReused:
+        raise HTTPException(status_code=401, detail="Refresh token reuse detected. All sessions have been revoked.")
+    if rotated is None:
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
-    # Revoke the old refresh token
-    await revoke_refresh_token(session, request.refresh_token)
-    # Get the user_id from the old refresh token
-    from app.db.crud_user import get_refresh_token
-    old_token_obj = await get_refresh_token(session, request.refresh_token)
-    user_id = old_token_obj.user_id if old_token_obj else None
-    if user_id is None:
-        raise HTTPException(status_code=401, detail="Invalid refresh token: user not found")
-    # Issue a new refresh token
-    new_refresh_token_obj = await create_refresh_token(session, user_id=user_id)
-    return {"access_token": new_access_token, "refresh_token": new_refresh_token_obj.token, "token_type": "bearer"}
+    user, new_refresh_token_obj = rotated
+    new_access_token = create_user_access_token(user)
+    return model_response(Token(access_token=new_access_token, refresh_token=new_refresh_token_obj.token))
 
 
 @router.post("/forgot-password", status_code=204)
@@ -145,11 +173,13 @@ async def forgot_password(request: ForgotPasswordRequest, session: AsyncSession
     if user:
         token = generate_password_reset_token(user.email)
         reset_link = f"{settings.frontend_url}/reset-password?token={token}"
-        send_email(
+        await queue_email(
+            session,
             to_email=user.email,
             subject="Password Reset Request",
             body=f"<p>Click <a href='{reset_link}'>here</a> to reset your password. This link will expire in 1 hour.</p>"
         )
+        await session.commit()
     # Always return 204 to prevent email enumeration
     return None
 
@@ -164,7 +194,9 @@ async def reset_password(request: ResetPasswordRequest, session: AsyncSession =
     if not user:
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="User not found")
-    user.hashed_pw = hash_password(request.new_password)
+    await session.release()
+    user.hashed_pw = await hash_password_async(request.new_password)
+    user.token_version = (user.token_version or 0) + 1
     session.add(user)
     await session.commit()
     return None
@@ -186,32 +218,28 @@ If 2FA is not enabled, omit two_fa_code or set it to null.
 )
 async def login_json(
     req: LoginJsonRequest,
+    request: Request,
     session: AsyncSession = Depends(get_session),
 ):
-    user = await get_user_by_email(session, req.username)
-    if not user or not verify_password(req.password, user.hashed_pw):
+    ip = client_ip(request)
+    user = await authenticate(session, ip, req.username, req.password)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     if not user.is_verified:
-        token = generate_email_verification_token(user.email)
-        verify_link = f"{settings.frontend_url}/auth/verify-email?token={token}"
-        send_email(
-            to_email=user.email,
-            subject="Verify your email",
-            body=f"<p>Click <a href='{verify_link}'>here</a> to verify your email address. This link will expire in 24 hours.</p>"
-        )
-        raise HTTPException(
-            status_code=403,
-            detail="Please verify your email before logging in. A new verification email has been sent."
-        )
+        sent = await queue_verification_email(session, user)
+        await session.commit()
+        raise HTTPException(status_code=403, detail=unverified_detail(sent))
     if user.is_2fa_enabled:
         if not req.two_fa_code:
             raise HTTPException(status_code=401, detail="2FA code required.")
         if user.totp_secret is None:
             raise HTTPException(status_code=500, detail="2FA is enabled but no TOTP secret is set for this user.")
-        import pyotp
-        totp = pyotp.TOTP(user.totp_secret)
-        if not totp.verify(req.two_fa_code):
+        if not await totp_verifier.verify(user.id, user.totp_secret, req.two_fa_code):
+            await login_limiter.record_failure(ip, req.username)
             raise HTTPException(status_code=401, detail="Invalid 2FA code.")
-    token = create_access_token(data={"sub": user.email})
+    await login_limiter.record_success(ip, req.username)
+    token = create_user_access_token(user)
+    # Commits the refresh token together with a rehashed password, if any
     refresh_token_obj = await create_refresh_token(session, user_id=user.id)
-    return {"access_token": token, "refresh_token": refresh_token_obj.token, "token_type": "bearer"}
+    await session.commit()
+    return model_response(Token(access_token=token, refresh_token=refresh_token_obj.token))
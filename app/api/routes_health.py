@@ -0,0 +1,24 @@
+# app/api/routes_health.py
+
+from fastapi import APIRouter
+
+from app.api.responses import ORJSONResponse
+from app.core.warmup import warmup
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live", include_in_schema=False)
+async def live():
+    return {"status": "ok"}
+
+
+@router.get("/ready", include_in_schema=False)
+async def ready():
+    # 503 until the pool and hashing workers are warm, and again while draining
+    if warmup.draining:
+        return ORJSONResponse({"status": "draining"}, status_code=503)
+    if not warmup.ready:
+        # Warmup errors are logged, not returned: the probe is unauthenticated
+        return ORJSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
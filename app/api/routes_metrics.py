@@ -0,0 +1,33 @@
+# app/api/routes_metrics.py
+
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.metrics import render_metrics
+
+
+def require_metrics_token(
+    x_admin_token: str | None = Header(None),
+    authorization: str | None = Header(None),
+) -> None:
+    # With ADMIN_API_TOKEN set, scrapers send it as X-Admin-Token or as a
+    # bearer token (Prometheus' `authorization` scrape option)
+    if not settings.admin_api_token:
+        return
+    token = x_admin_token
+    if token is None and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):]
+    if not token or not secrets.compare_digest(token, settings.admin_api_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+router = APIRouter(tags=["metrics"], dependencies=[Depends(require_metrics_token)])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    # Prometheus text exposition format; values are per worker process
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
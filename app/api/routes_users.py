@@ -1,58 +1,60 @@
 # app/api/routes_users.py
 
-from fastapi import APIRouter, Depends
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from app.api.schemas import UserOut
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_user_readonly, get_optional_token_payload, get_token_payload, stateless_principal
 from app.db.models import User
 from fastapi import Body
-from app.core.security import revoke_refresh_token_logic
+from app.core.security import create_user_access_token, revoke_refresh_token_logic
+from app.core.revocation import revoke_token
 from app.db.session import get_session
 from app.api.schemas import TokenRefreshRequest
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.schemas import UserUpdate, ChangePasswordRequest
-from app.core.security import verify_password, hash_password
-from pydantic_extra_types.phone_numbers import PhoneNumber
-import phonenumbers
+from app.core.security import verify_password_async, hash_password_async
 import pyotp
-import qrcode
-import io
 import base64
 from app.api.schemas import TwoFASetupResponse, TwoFAEnableRequest, TwoFADisableRequest
 from app.core.config import settings
+from app.core.totp import totp_verifier
+from app.core.phone import to_e164
+from app.api.responses import cached_user_out_response, model_response, user_out_response
+from app.core.qr import qr_renderer, FORMATS as QR_FORMATS
 router = APIRouter(prefix="/users", tags=["users"])
 global appname
 appname=settings.app_name
 
 @router.get("/me", response_model=UserOut)
-async def read_current_user(current_user: User = Depends(get_current_user)):
-    from app.api.schemas import UserOut
-    import phonenumbers
-    from pydantic_extra_types.phone_numbers import PhoneNumber
-    # Convert phone string to E.164 format for PhoneNumber
-    try:
-        parsed = phonenumbers.parse(current_user.phone, "IR")
-        e164 = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
-        phone = PhoneNumber(e164)
-    except Exception:
-        phone = PhoneNumber("+989000000000")  # fallback to a default valid phone number
-    return UserOut(
-        id=current_user.id,
-        email=current_user.email,
-        fname=current_user.fname,
-        lname=current_user.lname,
-        phone=phone,
-        is_active=current_user.is_active,
-        is_2fa_enabled=current_user.is_2fa_enabled
-    )
+async def read_current_user(request: Request, payload: dict = Depends(get_token_payload)):
+    # Stateless mode: a cached body is served on the token's claims alone,
+    # without loading the user
+    principal = stateless_principal(payload)
+    if principal is not None:
+        cached = cached_user_out_response(request, principal.id)
+        if cached is not None:
+            return cached
+    current_user = await get_current_user_readonly(payload)
+    return user_out_response(request, current_user, use_cache=True)
 
 
 @router.post("/logout", status_code=204)
-async def logout(request: TokenRefreshRequest = Body(...), session: AsyncSession = Depends(get_session)):
+async def logout(
+    request: TokenRefreshRequest = Body(...),
+    payload: dict | None = Depends(get_optional_token_payload),
+    session: AsyncSession = Depends(get_session),
+):
     await revoke_refresh_token_logic(session, request.refresh_token)
+    await session.commit()
+    # The access token sent along (if any) stops working too
+    if payload is not None:
+        revoke_token(payload)
     return None
 
 @router.patch("/me", response_model=UserOut)
 async def update_current_user(
+    request: Request,
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
@@ -66,15 +68,18 @@ async def update_current_user(
         updated = True
     if user_update.phone is not None:
         current_user.phone = str(user_update.phone)
+        current_user.phone_e164 = to_e164(current_user.phone)
         updated = True
     if user_update.email is not None:
+        if user_update.email != current_user.email:
+            # Email is an identity claim in access tokens
+            current_user.token_version = (current_user.token_version or 0) + 1
         current_user.email = user_update.email
         updated = True
     if updated:
         session.add(current_user)
         await session.commit()
-        await session.refresh(current_user)
-    return current_user
+    return user_out_response(request, current_user)
 
 @router.post("/change-password", status_code=204)
 async def change_password(
@@ -82,60 +87,90 @@ async def change_password(
     current_user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
-    if not verify_password(req.current_password, current_user.hashed_pw):
+    # Don't hold a pooled connection while bcrypt runs
+    await session.release()
+    if not await verify_password_async(req.current_password, current_user.hashed_pw):
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="Current password is incorrect")
-    current_user.hashed_pw = hash_password(req.new_password)
+    current_user.hashed_pw = await hash_password_async(req.new_password)
+    # Signs out every other access token of this user
+    current_user.token_version = (current_user.token_version or 0) + 1
     session.add(current_user)
     await session.commit()
     return None
 
+def _otp_uri(user: User) -> str:
+    return pyotp.totp.TOTP(user.totp_secret).provisioning_uri(name=user.email, issuer_name=appname)
+
+
 @router.post("/2fa/setup", response_model=TwoFASetupResponse)
-async def setup_2fa(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+async def setup_2fa(
+    format: Literal["png", "svg", "none"] = Query("png", description="Inline QR image format; \"none\" to fetch it from qr_url"),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
     if current_user.is_2fa_enabled:
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="2FA is already enabled.")
     # Generate a new TOTP secret
     secret = pyotp.random_base32()
-    # Generate QR code for authenticator apps
-    otp_uri = pyotp.totp.TOTP(secret).provisioning_uri(name=current_user.email, issuer_name=appname)
-    qr = qrcode.make(otp_uri)
-    buf = io.BytesIO()
-    qr.save(buf, format="PNG")
-    qr_b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    qr_data_uri = f"data:image/png;base64,{qr_b64}"
     # Save secret temporarily (not enabled yet)
     current_user.totp_secret = secret
     session.add(current_user)
     await session.commit()
-    await session.refresh(current_user)
-    return TwoFASetupResponse(qr_code=qr_data_uri, secret=secret)
+    qr_data_uri = None
+    if format != "none":
+        # Rendered off the event loop; GET /users/2fa/qr serves the raw image
+        image, _ = await qr_renderer.render(_otp_uri(current_user), format)
+        qr_data_uri = f"data:{QR_FORMATS[format]};base64,{base64.b64encode(image).decode()}"
+    return model_response(TwoFASetupResponse(qr_code=qr_data_uri, qr_url=f"{router.prefix}/2fa/qr", secret=secret))
+
+
+@router.get("/2fa/qr", response_class=Response, responses={200: {"content": {"image/png": {}, "image/svg+xml": {}}}})
+async def get_2fa_qr(
+    request: Request,
+    format: Literal["png", "svg"] = "png",
+    current_user: User = Depends(get_current_user_readonly),
+):
+    # Only while setup is pending; the secret is not shown again once enabled
+    if current_user.is_2fa_enabled or not current_user.totp_secret:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=404, detail="No 2FA setup in progress.")
+    image, etag = await qr_renderer.render(_otp_uri(current_user), format)
+    # The image embeds the secret: browser cache only, never shared caches
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, max-age=300", "Vary": "Authorization"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=image, media_type=QR_FORMATS[format], headers=headers)
 
 @router.post("/2fa/enable")
 async def enable_2fa(req: TwoFAEnableRequest, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
     if not current_user.totp_secret:
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="2FA setup not started.")
-    totp = pyotp.TOTP(current_user.totp_secret)
-    if not totp.verify(req.code):
+    if not await totp_verifier.verify(current_user.id, current_user.totp_secret, req.code):
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="Invalid 2FA code.")
     current_user.is_2fa_enabled = True
+    current_user.token_version = (current_user.token_version or 0) + 1
     session.add(current_user)
     await session.commit()
-    return {"detail": "2FA enabled successfully."}
+    # The bump above invalidates the caller's access token; hand out a new one
+    return {"detail": "2FA enabled successfully.", "access_token": create_user_access_token(current_user), "token_type": "bearer"}
 
 @router.post("/2fa/disable")
 async def disable_2fa(req: TwoFADisableRequest, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
     if not current_user.is_2fa_enabled or not current_user.totp_secret:
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="2FA is not enabled.")
-    totp = pyotp.TOTP(current_user.totp_secret)
-    if not totp.verify(req.code):
+    if not await totp_verifier.verify(current_user.id, current_user.totp_secret, req.code):
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="Invalid 2FA code.")
     current_user.is_2fa_enabled = False
+    current_user.token_version = (current_user.token_version or 0) + 1
     current_user.totp_secret = None
     session.add(current_user)
     await session.commit()
-    return {"detail": "2FA disabled successfully."}
\ No newline at end of file
+    totp_verifier.forget(current_user.id)
+    # The bump above invalidates the caller's access token; hand out a new one
+    return {"detail": "2FA disabled successfully.", "access_token": create_user_access_token(current_user), "token_type": "bearer"}
\ No newline at end of file
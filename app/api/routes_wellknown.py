@@ -0,0 +1,22 @@
+# app/api/routes_wellknown.py
+
+import orjson
+from fastapi import APIRouter, Request, Response
+
+from app.api.responses import body_etag
+from app.core.config import settings
+from app.core.keys import keyring
+
+router = APIRouter(prefix="/.well-known", tags=["keys"])
+
+
+@router.get("/jwks.json")
+async def jwks(request: Request):
+    # Public keys for verifying access tokens locally. Verifiers may cache it
+    # for max-age; new keys are published well before they start signing.
+    body = orjson.dumps(keyring.jwks() if keyring.enabled else {"keys": []})
+    etag = body_etag(body)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.jwt_jwks_max_age}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
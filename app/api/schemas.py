@@ -53,7 +53,8 @@ class ResetPasswordRequest(BaseModel):
     new_password: str
 
 class TwoFASetupResponse(BaseModel):
-    qr_code: str  # data URI
+    qr_code: str | None  # data URI, or None when format=none
+    qr_url: str  # GET this for the raw image
     secret: str
 
 class TwoFAEnableRequest(BaseModel):
@@ -5,8 +5,42 @@ from functools import lru_cache
 
 class Settings(BaseSettings):
     db_url: str | None = None
+    # Connection pool
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = False
+    # Connections opened before the worker reports ready; None = db_pool_size
+    db_pool_warm_connections: int | None = None
+    db_statement_cache_size: int = 500  # asyncpg prepared statements per connection
+    db_slow_query_ms: float = 200.0
+    db_echo: bool = False
+    # Read replicas, e.g. DB_REPLICA_URLS='["postgresql+asyncpg://.../db"]'
+    db_replica_urls: list[str] = []
+    db_replica_health_interval_seconds: float = 10.0
+    db_replica_max_lag_seconds: float = 5.0
+    # Users who just changed their row read from the primary for this long
+    db_read_your_writes_seconds: float = 5.0
     jwt_secret: str
+    # Asymmetric signing (RS256/ES256): directory of <kid>.pem keys, see app.core.keys
+    jwt_keys_dir: str | None = None
+    jwt_active_kid: str | None = None
+    # New keys are published in the JWKS this long before they start signing
+    jwt_key_publish_seconds: float = 900.0
+    jwt_keys_reload_seconds: float = 60.0
+    jwt_jwks_max_age: int = 300
+    # Keep accepting HS256 tokens without a kid (issued before switching to keys)
+    jwt_accept_legacy_hs256: bool = True
     access_token_expire_minutes: int = 30
+    # Per-worker cap for revoked jtis and per-user token versions (app.core.revocation)
+    token_revocation_max_entries: int = 100000
+    refresh_token_expire_days: int = 30
+    # Background purge of expired/revoked refresh tokens (0 disables it)
+    refresh_token_purge_interval_seconds: int = 3600
+    refresh_token_purge_batch_size: int = 1000
+    # Revoked tokens are kept this long to detect reuse of rotated tokens
+    refresh_token_revoked_retention_days: int = 7
     postgres_user: str
     postgres_password: str
     postgres_db: str
@@ -18,8 +52,136 @@ class Settings(BaseSettings):
     email_password: str
     email_from: str
     email_from_name: str
+    email_use_tls: bool = True
+    email_timeout_seconds: float = 10.0
+    # Outgoing mail queue: persistent SMTP connections, batching and retries
+    email_connections: int = 2
+    email_queue_size: int = 10000
+    email_batch_size: int = 20
+    email_max_retries: int = 5
+    email_retry_backoff_seconds: float = 1.0
+    email_idle_timeout_seconds: float = 30.0
+    # Durable outbox: emails are written to the email_outbox table in the
+    # request's transaction and sent by app.workers.email
+    email_outbox_enabled: bool = True
+    # Run an outbox worker inside the app; disable when running dedicated workers
+    email_outbox_inline_worker: bool = True
+    email_outbox_poll_seconds: float = 1.0
+    email_dedupe_window_seconds: int = 600
+    # Verification links minted within one window are identical (0 = new token every time)
+    email_verification_token_window_seconds: int = 600
     frontend_url: str
     app_name: str
+    # Region assumed for phone numbers given without a country code
+    phone_default_region: str = "IR"
+
+    # On SIGTERM, fail /health/ready and keep serving this long before
+    # shutting down (0 = stop right away)
+    shutdown_drain_seconds: float = 5.0
+
+    # Expose GET /metrics; it requires ADMIN_API_TOKEN when one is set
+    # (otherwise restrict access to it at the proxy)
+    metrics_enabled: bool = False
+    # Enables /admin routes (bulk user import); sent as X-Admin-Token
+    admin_api_token: str | None = None
+    # Bulk import (app.workers.import_users, POST /admin/users/import)
+    user_import_batch_size: int = 1000
+    user_import_workers: int | None = None  # CLI hashing processes; None = CPU count (the API uses the hashing pool)
+
+    # Request tracing (app.core.tracing). Traces are exported when sampled,
+    # slower than trace_slow_ms, or requested with "X-Trace: 1" + X-Admin-Token.
+    tracing_enabled: bool = False
+    trace_exporter: str = "file"  # "file" or "otlp"
+    trace_file: str = "traces.jsonl"
+    trace_otlp_endpoint: str = "http://localhost:4318"
+    trace_service_name: str = "fastapi-auth"
+    trace_sample_rate: float = 0.01
+    trace_slow_ms: float = 500.0
+    # Event-loop lag monitor (0 disables it)
+    loop_monitor_interval_ms: float = 100.0
+    loop_block_threshold_ms: float = 50.0
+    # Sampling profiler for a fraction of traced requests; profiles of the
+    # slowest N% (and of "X-Trace: profile" requests) go to profile_dir
+    profile_sample_rate: float = 0.0
+    profile_slowest_percent: float = 5.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "profiles"
+
+    # Trust identity claims in access tokens instead of loading the user per request
+    stateless_auth: bool = False
+
+    # Password hashing worker pool ("thread" or "process")
+    hash_pool_kind: str = "thread"
+    hash_pool_workers: int | None = None  # defaults to the number of CPUs
+    hash_pool_max_queue: int = 64
+
+    # Password hashing profile. The first scheme hashes new passwords; stored
+    # hashes in another scheme or with different cost parameters are rehashed
+    # on login. Tune with `python -m benchmarks.calibrate_kdf`.
+    password_schemes: list[str] = ["bcrypt"]  # e.g. ["argon2", "bcrypt"] (needs argon2-cffi)
+    bcrypt_rounds: int = 12
+    argon2_memory_cost: int = 65536  # KiB
+    argon2_time_cost: int = 3
+    argon2_parallelism: int = 4
+    password_rehash_on_login: bool = True
+
+    # 2FA: decoded-key cache and replay protection ("memory" or "redis" store
+    # for each user's last accepted time step)
+    totp_cache_size: int = 10000
+    totp_valid_window: int = 0  # extra 30 s steps accepted either side for clock drift
+    totp_replay_backend: str = "memory"
+    totp_redis_url: str = "redis://localhost:6379/0"
+
+    # 2FA setup QR codes: render threads and cache of rendered images
+    qr_render_workers: int = 2
+    qr_cache_size: int = 256
+
+    # Serialized GET /users/me bodies per user, invalidated with the user cache
+    me_cache_enabled: bool = False
+    me_cache_size: int = 10000
+    me_cache_ttl_seconds: float = 30.0
+
+    # In-process user cache; use the "socket" invalidation backend with several workers
+    user_cache_enabled: bool = False
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: float = 30.0
+
+    # Login rate limiting ("memory" or "redis" store). Every attempt spends
+    # from the IP bucket; failures also spend from the account and
+    # (IP, account) buckets. Buckets refill fully over their window.
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_ip_attempts: int = 30
+    rate_limit_ip_window_seconds: float = 60.0
+    rate_limit_account_failures: int = 10
+    rate_limit_account_window_seconds: float = 900.0
+    rate_limit_pair_failures: int = 5
+    rate_limit_pair_window_seconds: float = 300.0
+    # Reverse proxies in front of the app that append to X-Forwarded-For.
+    # Must be set behind a proxy, or all clients share the proxy's IP bucket
+    # (a warning is logged the first time X-Forwarded-For arrives while it is 0)
+    rate_limit_trusted_proxies: int = 0
+    # Dummy bcrypt verifications for unknown accounts; beyond this budget
+    # those logins sleep for the average verify time instead
+    rate_limit_dummy_verifies: int = 60
+    rate_limit_dummy_window_seconds: float = 60.0
+
+    # Bloom filter of registered emails; logins for absent emails skip the DB
+    # None: enabled only with a cross-worker invalidation backend, since with
+    # the in-process bus other workers reject new emails until their refresh
+    known_emails_filter_enabled: bool | None = None
+    known_emails_error_rate: float = 0.01
+    known_emails_refresh_seconds: float = 5.0
+    # Trailing window re-read on each refresh; covers transactions that commit
+    # up to this long after they started
+    known_emails_overlap_seconds: float = 60.0
+    known_emails_rebuild_seconds: float = 600.0
+
+    # Cross-worker invalidation ("memory" or "socket")
+    invalidation_backend: str = "memory"
+    # Private to the app's user (0700); None: $XDG_RUNTIME_DIR/fastapi-auth-bus or ./.run/invalidation-bus
+    invalidation_socket_dir: str | None = None
 
     model_config = SettingsConfigDict(env_file=".env")
 
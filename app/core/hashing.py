@@ -0,0 +1,89 @@
+# app/core/hashing.py
+
+# Bounded worker pool for CPU-heavy password hashing so bcrypt never runs on
+# the event loop. Admission control rejects work once the queue is full.
+
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+from app.core.tracing import record_span
+
+hash_queue_depth = Gauge("auth_hash_queue_depth", "Hash jobs waiting for or running in the worker pool")
+hash_rejected = Counter("auth_hash_rejected_total", "Hash jobs rejected because the queue was full")
+hash_wait_seconds = Histogram("auth_hash_wait_seconds", "Time hash jobs spent queued before running")
+hash_duration_seconds = Histogram("auth_hash_duration_seconds", "Time spent computing a hash or verification")
+
+
+class HashingPoolBusy(Exception):
+    pass
+
+
+def _timed_call(fn, submitted: float, *args):
+    # Runs inside the worker; returns the result plus queue wait and compute time.
+    # time.time() is used because perf_counter is not comparable across processes.
+    started = time.time()
+    result = fn(*args)
+    return result, started - submitted, time.time() - started
+
+
+class HashingPool:
+    def __init__(self, kind: str = "thread", workers: int | None = None, max_queue: int = 64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown hash pool kind: {kind}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+        return self._executor
+
+    async def run(self, fn, *args):
+        # Only the event loop thread touches _pending, so no lock is needed.
+        if self._pending >= self.workers + self.max_queue:
+            hash_rejected.inc()
+            raise HashingPoolBusy()
+        self._pending += 1
+        hash_queue_depth.set(self._pending)
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, waited, took = await loop.run_in_executor(
+                self._get_executor(), _timed_call, fn, time.time(), *args
+            )
+        finally:
+            self._pending -= 1
+            hash_queue_depth.set(self._pending)
+        hash_wait_seconds.observe(max(waited, 0.0))
+        hash_duration_seconds.observe(took)
+        record_span(
+            f"hash.{getattr(fn, '__name__', 'call')}", started, time.perf_counter() - started,
+            wait_ms=round(max(waited, 0.0) * 1000, 3), compute_ms=round(took * 1000, 3),
+        )
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_pool = HashingPool(
+    kind=settings.hash_pool_kind,
+    workers=settings.hash_pool_workers,
+    max_queue=settings.hash_pool_max_queue,
+)
@@ -0,0 +1,141 @@
+# app/core/invalidation.py
+
+# Tiny pub/sub used to keep per-worker in-memory state (caches, denylists)
+# coherent. Backends:
+#   memory - delivers to subscribers in this process only (single worker, tests)
+#   socket - unix datagram sockets in a shared directory, one per worker,
+#            so every uvicorn worker on the host receives each message
+#
+# The socket directory must be private to the app's user: anyone who can
+# create a socket in it can inject or receive cache and revocation
+# invalidations. It is created with mode 0700, and the bus refuses to start
+# if it is owned by another user or accessible to group/others. The default
+# is $XDG_RUNTIME_DIR/fastapi-auth-bus, or .run/invalidation-bus under the
+# working directory (where .env is read from).
+
+import atexit
+import json
+import logging
+import os
+import socket
+import stat
+import threading
+from collections import defaultdict
+from typing import Callable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[dict], None]
+
+
+class InvalidationBus:
+    def __init__(self):
+        self._subscribers: dict[str, list[Callback]] = defaultdict(list)
+
+    def subscribe(self, channel: str, callback: Callback) -> None:
+        self._subscribers[channel].append(callback)
+
+    def publish(self, channel: str, payload: dict) -> None:
+        self._deliver(channel, payload)
+
+    def _deliver(self, channel: str, payload: dict) -> None:
+        for callback in self._subscribers.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Invalidation subscriber failed on %s", channel)
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryBus(InvalidationBus):
+    pass
+
+
+class LocalSocketBus(InvalidationBus):
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        _private_directory(directory)
+        self.path = os.path.join(directory, f"{os.getpid()}-{id(self)}.sock")
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._closed = False
+        self._thread = threading.Thread(target=self._receive_loop, name="invalidation-bus", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def publish(self, channel: str, payload: dict) -> None:
+        self._deliver(channel, payload)
+        data = json.dumps({"c": channel, "p": payload}).encode()
+        for name in os.listdir(self.directory):
+            peer = os.path.join(self.directory, name)
+            if peer == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self._sock.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker exited without cleaning up its socket
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except OSError:
+                logger.warning("Could not deliver invalidation to %s", peer)
+
+    def _receive_loop(self) -> None:
+        while not self._closed:
+            try:
+                data = self._sock.recv(65536)
+            except OSError:
+                return
+            try:
+                message = json.loads(data)
+                self._deliver(message["c"], message["p"])
+            except (ValueError, KeyError):
+                logger.warning("Dropped malformed invalidation message")
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def _private_directory(directory: str) -> None:
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f"Invalidation socket path {directory} is not a directory")
+    if info.st_uid != os.getuid():
+        raise RuntimeError(f"Invalidation socket directory {directory} is owned by uid {info.st_uid}, not {os.getuid()}")
+    if info.st_mode & 0o077:
+        raise RuntimeError(
+            f"Invalidation socket directory {directory} is accessible to other users "
+            f"(mode {stat.S_IMODE(info.st_mode):o}); it must be 0700"
+        )
+
+
+def default_socket_dir() -> str:
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "fastapi-auth-bus")
+    return os.path.abspath(os.path.join(".run", "invalidation-bus"))
+
+
+def create_bus(backend: str) -> InvalidationBus:
+    if backend == "memory":
+        return InMemoryBus()
+    if backend == "socket":
+        return LocalSocketBus(settings.invalidation_socket_dir or default_socket_dir())
+    raise ValueError(f"Unknown invalidation backend: {backend}")
+
+
+bus = create_bus(settings.invalidation_backend)
@@ -0,0 +1,220 @@
+# app/core/keys.py
+
+# Asymmetric JWT signing keys. With JWT_KEYS_DIR set, access tokens are
+# signed with a private key from that directory and carry its file name as
+# the "kid" header; every key in the directory is published at
+# /.well-known/jwks.json so other services can verify tokens locally.
+#
+# Rotation without restarts: drop a new <kid>.pem into the directory. It is
+# published immediately and becomes the signing key once it is
+# JWT_KEY_PUBLISH_SECONDS old (by mtime), so verifiers have refreshed their
+# JWKS cache by then. Keep the old key until the last token it signed has
+# expired (or replace it with its public half, <kid>.pub.pem), then delete it.
+# JWT_ACTIVE_KID pins the signing key explicitly.
+#
+# Parsed key objects are cached per file (path + mtime). The app loads the
+# directory at startup and a background task re-scans it every
+# JWT_KEYS_RELOAD_SECONDS in a thread, swapping in the new map; requests only
+# read the cached map, so PEM is never parsed on the request path.
+#
+#   python -m app.core.keys generate --dir keys --alg RS256
+
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk
+from jose.backends.base import Key
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_CURVES = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    public: Key
+    private: Key | None
+    activates_at: float
+
+
+def _algorithm_for(key) -> str:
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and key.curve.name in _CURVES:
+        return _CURVES[key.curve.name]
+    raise ValueError(f"Unsupported JWT key type {type(key).__name__} (use RSA or EC P-256/384/521)")
+
+
+def load_key_file(path: str, publish_seconds: float) -> SigningKey:
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        pem = f.read()
+    if name.endswith(".pub.pem"):
+        kid = name[: -len(".pub.pem")]
+        parsed = serialization.load_pem_public_key(pem)
+        private = None
+    else:
+        kid = name[: -len(".pem")]
+        parsed = serialization.load_pem_private_key(pem, password=None)
+        private = parsed
+    algorithm = _algorithm_for(parsed)
+    public_pem = parsed.public_key() if private is not None else parsed
+    public_pem = public_pem.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return SigningKey(
+        kid=kid,
+        algorithm=algorithm,
+        public=jwk.construct(public_pem, algorithm),
+        private=jwk.construct(pem, algorithm) if private is not None else None,
+        activates_at=os.stat(path).st_mtime + publish_seconds,
+    )
+
+
+class Keyring:
+    def __init__(self, directory: str | None, publish_seconds: float, reload_seconds: float, active_kid: str | None = None):
+        self.directory = directory
+        self.publish_seconds = publish_seconds
+        self.reload_seconds = reload_seconds
+        self.active_kid = active_kid
+        self._files: dict[str, tuple[float, SigningKey]] = {}
+        self._keys: dict[str, SigningKey] = {}
+        self._jwks: dict | None = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def reload(self) -> None:
+        files = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".pem"):
+                continue
+            path = os.path.join(self.directory, name)
+            mtime = os.stat(path).st_mtime
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == mtime:
+                files[path] = cached
+                continue
+            try:
+                files[path] = (mtime, load_key_file(path, self.publish_seconds))
+            except (ValueError, TypeError, OSError) as exc:
+                logger.error("Skipping JWT key %s: %s", path, exc)
+        keys = {key.kid: key for _, key in files.values()}
+        with self._lock:
+            if keys != self._keys:
+                self._jwks = None
+            self._files, self._keys, self._loaded_at = files, keys, time.monotonic()
+
+    def _current(self) -> dict[str, SigningKey]:
+        # Loads synchronously only on first use outside the app (CLI, scripts);
+        # the app loads at startup and run_reloader keeps the map current
+        if not self._loaded_at:
+            self.reload()
+        return self._keys
+
+    async def run_reloader(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                await asyncio.to_thread(self.reload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Could not reload JWT keys from %s", self.directory)
+
+    def signing_key(self) -> SigningKey:
+        keys = [key for key in self._current().values() if key.private is not None]
+        if self.active_kid:
+            for key in keys:
+                if key.kid == self.active_kid:
+                    return key
+            raise RuntimeError(f"JWT_ACTIVE_KID {self.active_kid} not found in {self.directory}")
+        if not keys:
+            raise RuntimeError(f"No private JWT keys in {self.directory}")
+        now = time.time()
+        ready = [key for key in keys if key.activates_at <= now]
+        # The newest key past its publish window; on a fresh keyring, the oldest key
+        if ready:
+            return max(ready, key=lambda key: key.activates_at)
+        return min(keys, key=lambda key: key.activates_at)
+
+    def verification_key(self, kid: str) -> SigningKey | None:
+        return self._current().get(kid)
+
+    def jwks(self) -> dict:
+        keys = self._current()
+        jwks = self._jwks
+        if jwks is None:
+            entries = []
+            for key in keys.values():
+                entry = key.public.to_dict()
+                entry.update(kid=key.kid, use="sig", alg=key.algorithm)
+                entries.append(entry)
+            jwks = self._jwks = {"keys": entries}
+        return jwks
+
+
+keyring = Keyring(
+    directory=settings.jwt_keys_dir,
+    publish_seconds=settings.jwt_key_publish_seconds,
+    reload_seconds=settings.jwt_keys_reload_seconds,
+    active_kid=settings.jwt_active_kid,
+)
+
+
+def generate_key(directory: str, algorithm: str, kid: str | None = None) -> str:
+    if algorithm == "RS256":
+        private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm in ("ES256", "ES384", "ES512"):
+        curve = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}[algorithm]()
+        private = ec.generate_private_key(curve)
+    else:
+        raise ValueError(f"Unsupported algorithm {algorithm}")
+    os.makedirs(directory, exist_ok=True)
+    kid = kid or time.strftime("%Y%m%d%H%M%S")
+    path = os.path.join(directory, f"{kid}.pem")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(private.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage JWT signing keys")
+    sub = parser.add_subparsers(dest="command", required=True)
+    generate = sub.add_parser("generate", help="create a new private key (published now, signs after the publish window)")
+    generate.add_argument("--dir", default=settings.jwt_keys_dir or "keys")
+    generate.add_argument("--alg", default="RS256", choices=["RS256", "ES256", "ES384", "ES512"])
+    generate.add_argument("--kid")
+    sub.add_parser("list", help="show keys and which one signs")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        print(generate_key(args.dir, args.alg, args.kid))
+    else:
+        if not keyring.enabled:
+            parser.error("JWT_KEYS_DIR is not set")
+        active = keyring.signing_key()
+        for key in keyring._current().values():
+            marker = "*" if key.kid == active.kid else " "
+            kind = "private" if key.private is not None else "public"
+            since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(key.activates_at))
+            print(f"{marker} {key.kid} {key.algorithm} {kind} signs-from={since}")
+
+
+if __name__ == "__main__":
+    main()
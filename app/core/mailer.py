@@ -0,0 +1,204 @@
+# app/core/mailer.py
+
+# Non-blocking email delivery. Request handlers enqueue messages and return;
+# a pool of dispatcher tasks, each owning one persistent authenticated SMTP
+# connection, drains the queue in batches and retries failures with
+# exponential backoff. smtplib calls run in threads so the event loop never
+# blocks on the mail server.
+
+import asyncio
+import logging
+import smtplib
+import time
+from dataclasses import dataclass
+from email.mime.text import MIMEText
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+from app.core.tracing import span, tracer
+
+logger = logging.getLogger(__name__)
+
+emails_enqueued = Counter("auth_email_enqueued_total", "Emails accepted for delivery")
+emails_sent = Counter("auth_email_sent_total", "Emails delivered to the SMTP server")
+emails_failed = Counter("auth_email_failed_total", "Emails dropped after exhausting retries or a full queue")
+emails_retried = Counter("auth_email_retried_total", "Email delivery retries")
+email_queue_depth = Gauge("auth_email_queue_depth", "Emails waiting for delivery")
+email_batch_seconds = Histogram("auth_email_batch_seconds", "Time to deliver one batch over SMTP")
+
+
+@dataclass
+class OutgoingEmail:
+    to_email: str
+    subject: str
+    body: str
+    attempts: int = 0
+
+
+def build_message(email: OutgoingEmail) -> MIMEText:
+    msg = MIMEText(email.body, "html")
+    msg["Subject"] = email.subject
+    msg["From"] = f'{settings.email_from_name} <{settings.email_from}>'
+    msg["To"] = email.to_email
+    return msg
+
+
+class SMTPConnection:
+    # One reusable SMTP session. Not thread-safe: each dispatcher owns one and
+    # only uses it from one worker thread at a time.
+
+    def __init__(self):
+        self._smtp: smtplib.SMTP | None = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(settings.email_host, settings.email_port, timeout=settings.email_timeout_seconds)
+        if settings.email_use_tls:
+            smtp.starttls()
+        if settings.email_user:
+            smtp.login(settings.email_user, settings.email_password)
+        return smtp
+
+    def _ensure_connected(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > settings.email_idle_timeout_seconds:
+            # Servers drop idle sessions; probe before reuse
+            try:
+                self._smtp.noop()
+            except smtplib.SMTPException:
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def send_batch(self, emails: list[OutgoingEmail]) -> list[Exception | None]:
+        results: list[Exception | None] = []
+        for email in emails:
+            try:
+                try:
+                    smtp = self._ensure_connected()
+                    smtp.sendmail(settings.email_from, [email.to_email], build_message(email).as_string())
+                except smtplib.SMTPServerDisconnected:
+                    self.close()
+                    smtp = self._ensure_connected()
+                    smtp.sendmail(settings.email_from, [email.to_email], build_message(email).as_string())
+                results.append(None)
+            except (smtplib.SMTPException, OSError) as exc:
+                if not isinstance(exc, smtplib.SMTPRecipientsRefused):
+                    self.close()
+                results.append(exc)
+        self._last_used = time.monotonic()
+        return results
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+
+class EmailDispatcher:
+    def __init__(
+        self,
+        connections: int,
+        queue_size: int,
+        batch_size: int,
+        max_retries: int,
+        backoff_seconds: float,
+    ):
+        self.connections = connections
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._queue: asyncio.Queue[OutgoingEmail] = asyncio.Queue(maxsize=queue_size)
+        self._workers: list[asyncio.Task] = []
+        self._retry_tasks: set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> bool:
+        try:
+            self._queue.put_nowait(OutgoingEmail(to_email=to_email, subject=subject, body=body))
+        except asyncio.QueueFull:
+            emails_failed.inc(reason="queue_full")
+            logger.error("Email queue full, dropping message to %s", to_email)
+            return False
+        emails_enqueued.inc()
+        email_queue_depth.set(self._queue.qsize())
+        return True
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._run(SMTPConnection()), name=f"email-dispatcher-{i}")
+                for i in range(self.connections)
+            ]
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping email dispatcher with %d queued emails", self._queue.qsize())
+        for task in [*self._workers, *self._retry_tasks]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retry_tasks, return_exceptions=True)
+        self._workers = []
+
+    async def _run(self, connection: SMTPConnection) -> None:
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                email_queue_depth.set(self._queue.qsize())
+                started = time.perf_counter()
+                try:
+                    async with tracer.background("email.send_batch", emails=len(batch)):
+                        with span("smtp.send", emails=len(batch)):
+                            results = await asyncio.to_thread(connection.send_batch, batch)
+                except Exception as exc:
+                    logger.exception("Email batch failed")
+                    results = [exc] * len(batch)
+                email_batch_seconds.observe(time.perf_counter() - started)
+                for email, error in zip(batch, results):
+                    if error is None:
+                        emails_sent.inc()
+                    else:
+                        self._retry_later(email, error)
+                    self._queue.task_done()
+        finally:
+            await asyncio.to_thread(connection.close)
+
+    def _retry_later(self, email: OutgoingEmail, error: Exception) -> None:
+        email.attempts += 1
+        if email.attempts > self.max_retries:
+            emails_failed.inc(reason="retries_exhausted")
+            logger.error("Giving up on email to %s after %d attempts: %s", email.to_email, email.attempts, error)
+            return
+        emails_retried.inc()
+        delay = self.backoff_seconds * 2 ** (email.attempts - 1)
+        task = asyncio.create_task(self._requeue(email, delay))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _requeue(self, email: OutgoingEmail, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait(email)
+        except asyncio.QueueFull:
+            emails_failed.inc(reason="queue_full")
+            logger.error("Email queue full, dropping retry to %s", email.to_email)
+
+
+email_dispatcher = EmailDispatcher(
+    connections=settings.email_connections,
+    queue_size=settings.email_queue_size,
+    batch_size=settings.email_batch_size,
+    max_retries=settings.email_max_retries,
+    backoff_seconds=settings.email_retry_backoff_seconds,
+)
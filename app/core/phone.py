@@ -0,0 +1,18 @@
+# app/core/phone.py
+
+import phonenumbers
+
+from app.core.config import settings
+
+
+def to_e164(value: str | None, region: str = None) -> str | None:
+    # Canonical form stored in users.phone_e164. Accepts anything
+    # phonenumbers can parse (E.164, RFC 3966 "tel:" URIs, national numbers
+    # in the default region); returns None if it can't be parsed.
+    if not value:
+        return None
+    try:
+        parsed = phonenumbers.parse(str(value), region or settings.phone_default_region)
+    except phonenumbers.NumberParseException:
+        return None
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
@@ -0,0 +1,93 @@
+# app/core/qr.py
+
+# QR code rendering for 2FA setup. Building the matrix and encoding the image
+# is pure CPU work, so it runs on a small worker pool instead of the event
+# loop. Rendered images are kept in a bounded LRU keyed by a digest of the
+# content and format; the same digest is the HTTP ETag.
+
+import asyncio
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram
+from app.core.tracing import record_span
+
+qr_render_seconds = Histogram("auth_qr_render_seconds", "QR code render time")
+qr_cache = Counter("auth_qr_cache_total", "Rendered QR code cache lookups by result")
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def render_qr(data: str, fmt: str = "png", box_size: int = 4, border: int = 4, mask_pattern: int | None = 2) -> bytes:
+    # box_size is pixels per module for PNG. 4 is plenty for phone cameras and
+    # is a fraction of qrcode.make()'s default size (10). Every mask pattern
+    # gives a valid code; fixing one skips scoring all eight, which is most of
+    # the render time. Pass mask_pattern=None to pick the best-scoring mask.
+    # qrcode (and PIL) are imported on first use: only 2FA setup needs them,
+    # and together they are the bulk of the app's import time.
+    import qrcode
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(box_size=box_size, border=border, mask_pattern=mask_pattern)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buf = io.BytesIO()
+    if fmt == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    elif fmt == "png":
+        qr.make_image().save(buf, format="PNG", optimize=True)
+    else:
+        raise ValueError(f"Unknown QR format: {fmt}")
+    return buf.getvalue()
+
+
+def qr_etag(data: str, fmt: str) -> str:
+    return hashlib.sha256(f"{fmt}:{data}".encode()).hexdigest()[:32]
+
+
+class QRRenderer:
+    def __init__(self, workers: int, cache_size: int):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._executor: ThreadPoolExecutor | None = None
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="qr")
+        return self._executor
+
+    async def render(self, data: str, fmt: str = "png") -> tuple[bytes, str]:
+        # Returns (image bytes, etag)
+        etag = qr_etag(data, fmt)
+        with self._lock:
+            image = self._cache.get(etag)
+            if image is not None:
+                self._cache.move_to_end(etag)
+        if image is not None:
+            qr_cache.inc(result="hit")
+            return image, etag
+        qr_cache.inc(result="miss")
+        started = time.perf_counter()
+        image = await asyncio.get_running_loop().run_in_executor(self._get_executor(), render_qr, data, fmt)
+        qr_render_seconds.observe(time.perf_counter() - started, format=fmt)
+        record_span("qr.render", started, time.perf_counter() - started, format=fmt)
+        with self._lock:
+            self._cache[etag] = image
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return image, etag
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+qr_renderer = QRRenderer(workers=settings.qr_render_workers, cache_size=settings.qr_cache_size)
@@ -0,0 +1,261 @@
+# app/core/ratelimit.py
+
+# Login throttling with token buckets. Every attempt spends a token from the
+# client IP's bucket; failed attempts also spend from the account's bucket and
+# from the (IP, account) bucket. An empty bucket rejects the attempt before the
+# user is loaded or bcrypt runs. Stores:
+#   memory - sharded in-process dict (single worker, tests)
+#   redis  - shared across workers and hosts; buckets are updated atomically
+#            by a Lua script using the server clock
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+rate_limit_rejected = Counter("auth_rate_limit_rejected_total", "Login attempts rejected by the rate limiter")
+rate_limit_failures = Counter("auth_rate_limit_failures_total", "Failed login attempts charged to the limiter")
+rate_limit_store_errors = Counter("auth_rate_limit_store_errors_total", "Rate limit store errors (the limiter fails open)")
+
+
+class RateLimited(Exception):
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(scope)
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Rule:
+    scope: str
+    capacity: int
+    window_seconds: float
+
+    @property
+    def rate(self) -> float:
+        # Tokens regained per second; an empty bucket is full again after one window
+        return self.capacity / self.window_seconds
+
+
+class RateLimitStore:
+    async def take(self, key: str, rule: Rule, consume: bool = True) -> float:
+        # Spends one token (or only checks for one when consume is False).
+        # Returns 0 when a token was available, else seconds until one is.
+        raise NotImplementedError
+
+    async def reset(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStore(RateLimitStore):
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 10000):
+        self.max_keys_per_shard = max_keys_per_shard
+        # key -> (tokens, updated, capacity, rate)
+        self._shards: list[dict[str, tuple[float, float, int, float]]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _shard(self, key: str) -> int:
+        return hash(key) % len(self._shards)
+
+    async def take(self, key: str, rule: Rule, consume: bool = True) -> float:
+        index = self._shard(key)
+        with self._locks[index]:
+            shard = self._shards[index]
+            now = time.monotonic()
+            tokens, updated, _, _ = shard.get(key, (rule.capacity, now, rule.capacity, rule.rate))
+            tokens = min(rule.capacity, tokens + (now - updated) * rule.rate)
+            if tokens < 1:
+                wait = (1 - tokens) / rule.rate
+            else:
+                wait = 0.0
+                if consume:
+                    tokens -= 1
+            if tokens >= rule.capacity:
+                # A full bucket is the same as no bucket
+                shard.pop(key, None)
+            else:
+                shard[key] = (tokens, now, rule.capacity, rule.rate)
+                if len(shard) > self.max_keys_per_shard:
+                    self._prune(shard, now)
+            return wait
+
+    async def reset(self, key: str) -> None:
+        index = self._shard(key)
+        with self._locks[index]:
+            self._shards[index].pop(key, None)
+
+    def _prune(self, shard: dict, now: float) -> None:
+        # Drop buckets that have refilled; if that isn't enough, the oldest
+        # half goes (an attacker rotating keys only gets fresh buckets)
+        for key, (tokens, updated, capacity, rate) in list(shard.items()):
+            if tokens + (now - updated) * rate >= capacity:
+                del shard[key]
+        if len(shard) > self.max_keys_per_shard:
+            for key in list(shard)[: len(shard) // 2]:
+                del shard[key]
+
+
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local consume = ARGV[3] == '1'
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+  wait = (1 - tokens) / rate
+elseif consume then
+  tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisStore(RateLimitStore):
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from exc
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rule: Rule, consume: bool = True) -> float:
+        wait = await self._take(keys=[self.prefix + key], args=[rule.capacity, rule.rate, "1" if consume else "0"])
+        return float(wait)
+
+    async def reset(self, key: str) -> None:
+        await self._client.delete(self.prefix + key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class LoginLimiter:
+    def __init__(
+        self,
+        store: RateLimitStore,
+        ip: Rule,
+        account: Rule,
+        pair: Rule,
+        dummy: Rule,
+        enabled: bool = True,
+    ):
+        self.store = store
+        self.ip = ip
+        self.account = account
+        self.pair = pair
+        self.dummy = dummy
+        self.enabled = enabled
+
+    @staticmethod
+    def _account(username: str) -> str:
+        return username.strip().lower()[:320]
+
+    async def _take(self, key: str, rule: Rule, consume: bool) -> float:
+        try:
+            return await self.store.take(key, rule, consume)
+        except Exception:
+            # Never lock everyone out because the store is down
+            rate_limit_store_errors.inc()
+            logger.exception("Rate limit store failed")
+            return 0.0
+
+    async def check(self, ip: str, username: str) -> None:
+        # Call before loading the user; raises RateLimited
+        if not self.enabled:
+            return
+        account = self._account(username)
+        for key, rule, consume in (
+            (f"ip:{ip}", self.ip, True),
+            (f"account:{account}", self.account, False),
+            (f"pair:{ip}:{account}", self.pair, False),
+        ):
+            wait = await self._take(key, rule, consume)
+            if wait > 0:
+                rate_limit_rejected.inc(scope=rule.scope)
+                raise RateLimited(rule.scope, wait)
+
+    async def record_failure(self, ip: str, username: str) -> None:
+        if not self.enabled:
+            return
+        rate_limit_failures.inc()
+        account = self._account(username)
+        await self._take(f"account:{account}", self.account, True)
+        await self._take(f"pair:{ip}:{account}", self.pair, True)
+
+    async def allow_dummy_verify(self) -> bool:
+        # Shared budget of dummy bcrypt verifications for unknown accounts
+        if not self.enabled:
+            return True
+        return await self._take("dummy-verify", self.dummy, True) == 0
+
+    async def record_success(self, ip: str, username: str) -> None:
+        # The account bucket is left alone so a distributed guessing run is
+        # not undone by the owner logging in
+        if not self.enabled:
+            return
+        try:
+            await self.store.reset(f"pair:{ip}:{self._account(username)}")
+        except Exception:
+            rate_limit_store_errors.inc()
+            logger.exception("Rate limit store failed")
+
+
+_untrusted_forwarded_warned = False
+
+
+def client_ip(request: Request) -> str:
+    # With RATE_LIMIT_TRUSTED_PROXIES=n, the address n hops from the right of
+    # X-Forwarded-For is the client (entries left of it are client-supplied)
+    global _untrusted_forwarded_warned
+    hops = settings.rate_limit_trusted_proxies
+    if hops == 0 and not _untrusted_forwarded_warned and "x-forwarded-for" in request.headers:
+        # Behind a proxy every client shares the proxy's IP bucket
+        _untrusted_forwarded_warned = True
+        logger.warning(
+            "X-Forwarded-For received but RATE_LIMIT_TRUSTED_PROXIES=0: login attempts are "
+            "limited per peer address (%s). Behind a reverse proxy all clients share one "
+            "IP bucket; set RATE_LIMIT_TRUSTED_PROXIES to the number of proxies.",
+            request.client.host if request.client else "unknown",
+        )
+    if hops > 0:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.client.host if request.client else "unknown"
+
+
+def create_store(backend: str) -> RateLimitStore:
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "redis":
+        return RedisStore(settings.rate_limit_redis_url)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+login_limiter = LoginLimiter(
+    store=create_store(settings.rate_limit_backend),
+    ip=Rule("ip", settings.rate_limit_ip_attempts, settings.rate_limit_ip_window_seconds),
+    account=Rule("account", settings.rate_limit_account_failures, settings.rate_limit_account_window_seconds),
+    pair=Rule("pair", settings.rate_limit_pair_failures, settings.rate_limit_pair_window_seconds),
+    dummy=Rule("dummy", settings.rate_limit_dummy_verifies, settings.rate_limit_dummy_window_seconds),
+    enabled=settings.rate_limit_enabled,
+)
@@ -0,0 +1,148 @@
+# app/core/revocation.py
+
+# Access-token revocation without a database query on the request path.
+#
+#   jti       - logout denies the presented token until it expires
+#   token_ver - bumping users.token_version (password change/reset, 2FA
+#               on/off, email change) rejects every older token of that user
+#
+# Both live in bounded in-memory maps whose entries expire together with the
+# tokens they cover (at most ACCESS_TOKEN_EXPIRE_MINUTES). Changes are
+# broadcast on the invalidation bus so every worker applies them; the
+# "memory" bus backend keeps it in-process for tests and single workers.
+# Committed token_version bumps are picked up from the session automatically
+# (see the events at the bottom). get_current_user still compares the version
+# with the loaded row, so a worker that missed a message (restart, evicted
+# entry) falls back to that check.
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.invalidation import bus
+from app.core.metrics import Counter, Gauge
+from app.db.models import User
+
+CHANNEL = "revocation"
+
+revocations_total = Counter("auth_token_revocations_total", "Access-token revocations applied, by kind")
+revoked_rejections = Counter("auth_revoked_token_rejections_total", "Requests rejected with a revoked access token, by reason")
+revocation_entries = Gauge("auth_token_revocation_entries", "Entries held in the in-memory revocation lists")
+
+
+class RevocationList:
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # jti -> token expiry (epoch seconds)
+        self._jtis: OrderedDict[str, float] = OrderedDict()
+        # user id -> (entry expiry, lowest valid token version)
+        self._versions: OrderedDict[int, tuple[float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        # Tokens are issued with the same lifetime, so insertion order is
+        # close to expiry order; the size cap bounds memory regardless
+        while self._jtis and (next(iter(self._jtis.values())) <= now or len(self._jtis) > self.maxsize):
+            self._jtis.popitem(last=False)
+        while self._versions and (next(iter(self._versions.values()))[0] <= now or len(self._versions) > self.maxsize):
+            self._versions.popitem(last=False)
+        revocation_entries.set(len(self._jtis), kind="jti")
+        revocation_entries.set(len(self._versions), kind="version")
+
+    def add_jti(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        if expires_at <= now:
+            return
+        with self._lock:
+            self._jtis[jti] = expires_at
+            self._prune(now)
+
+    def set_min_version(self, user_id: int, version: int) -> None:
+        now = time.time()
+        with self._lock:
+            current = self._versions.pop(user_id, None)
+            if current is not None and current[0] > now:
+                version = max(version, current[1])
+            self._versions[user_id] = (now + self.ttl, version)
+            self._prune(now)
+
+    def is_revoked(self, payload: dict) -> str | None:
+        # Returns the reason, or None for a valid token
+        now = time.time()
+        jti = payload.get("jti")
+        if jti is not None:
+            expires_at = self._jtis.get(jti)
+            if expires_at is not None and expires_at > now:
+                return "jti"
+        user_id = payload.get("uid")
+        if user_id is not None and "ver" in payload:
+            entry = self._versions.get(user_id)
+            if entry is not None and entry[0] > now and payload["ver"] < entry[1]:
+                return "version"
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._jtis.clear()
+            self._versions.clear()
+            self._prune(time.time())
+
+
+revocations = RevocationList(
+    ttl=settings.access_token_expire_minutes * 60,
+    maxsize=settings.token_revocation_max_entries,
+)
+
+
+def revoke_token(payload: dict) -> None:
+    # Deny one access token (by its jti) until it expires
+    if payload.get("jti") is None or payload.get("exp") is None:
+        return
+    bus.publish(CHANNEL, {"jti": payload["jti"], "exp": payload["exp"]})
+
+
+def revoke_user_tokens(user_id: int, version: int) -> None:
+    # Deny every token of the user issued before token_version became `version`
+    bus.publish(CHANNEL, {"uid": user_id, "ver": version})
+
+
+def check_revoked(payload: dict) -> bool:
+    reason = revocations.is_revoked(payload)
+    if reason is not None:
+        revoked_rejections.inc(reason=reason)
+    return reason is not None
+
+
+def _on_revocation(payload: dict) -> None:
+    if payload.get("jti") is not None:
+        revocations.add_jti(payload["jti"], float(payload["exp"]))
+        revocations_total.inc(kind="jti")
+    elif payload.get("uid") is not None:
+        revocations.set_min_version(payload["uid"], payload["ver"])
+        revocations_total.inc(kind="version")
+
+
+bus.subscribe(CHANNEL, _on_revocation)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_version_bumps(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, User) and inspect(obj).attrs.token_version.history.deleted:
+            session.info.setdefault("token_version_bumps", {})[obj.id] = obj.token_version
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_version_bumps(session):
+    for user_id, version in session.info.pop("token_version_bumps", {}).items():
+        revoke_user_tokens(user_id, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_version_bumps(session):
+    session.info.pop("token_version_bumps", None)
@@ -1,20 +1,63 @@
 # app/core/security.py
 
 from passlib.context import CryptContext
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import secrets
+import time
 from app.core.config import settings
+from app.core.hashing import hashing_pool
+from app.core.keys import keyring
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.db.models import User
 
-from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-import smtplib
-from email.mime.text import MIMEText
+from itsdangerous import URLSafeTimedSerializer, TimestampSigner, BadSignature, SignatureExpired, want_bytes
+from itsdangerous.encoding import base64_encode, int_to_bytes
+from app.core.mailer import email_dispatcher
+from app.core.tracing import span
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def build_pwd_context(
+    schemes: list[str] = None,
+    bcrypt_rounds: int = None,
+    argon2_memory_cost: int = None,
+    argon2_time_cost: int = None,
+    argon2_parallelism: int = None,
+) -> CryptContext:
+    # The first scheme hashes new passwords. Hashes in any other scheme, or
+    # with a cost different from the target (weaker or stronger), are flagged
+    # by needs_update and rehashed on the next successful login.
+    schemes = schemes or settings.password_schemes
+    bcrypt_rounds = bcrypt_rounds or settings.bcrypt_rounds
+    argon2_memory_cost = argon2_memory_cost or settings.argon2_memory_cost
+    argon2_time_cost = argon2_time_cost or settings.argon2_time_cost
+    if "argon2" in schemes:
+        from passlib.hash import argon2
+        if not argon2.has_backend():
+            raise RuntimeError("PASSWORD_SCHEMES includes argon2, which requires the 'argon2-cffi' package")
+    return CryptContext(
+        schemes=schemes,
+        default=schemes[0],
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+        argon2__parallelism=argon2_parallelism or settings.argon2_parallelism,
+    )
+
+
+pwd_context = build_pwd_context()
 ALGORITHM = "HS256"
+# Parsed once instead of on every encode/decode
+_hmac_key = jwk.construct(settings.jwt_secret, ALGORITHM)
 
 
 def hash_password(password: str) -> str:
@@ -25,21 +68,115 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # Returns (valid, new_hash); new_hash is set when the stored hash doesn't
+    # match the current profile and should replace it
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# Async variants for request handlers: the KDF runs on the hashing pool and
+# raises HashingPoolBusy (mapped to 503) when the pool is saturated.
+async def hash_password_async(password: str) -> str:
+    return await hashing_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    started = time.perf_counter()
+    result = await hashing_pool.run(verify_password, plain_password, hashed_password)
+    _observe_verify(time.perf_counter() - started)
+    return result
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    started = time.perf_counter()
+    valid, new_hash = await hashing_pool.run(verify_and_update_password, plain_password, hashed_password)
+    if new_hash is None:
+        # Rehashing takes a second KDF run; keep it out of the timing average
+        _observe_verify(time.perf_counter() - started)
+    return valid, new_hash
+
+
+# Logins for unknown accounts must take as long as a wrong password. A dummy
+# verification against a real hash does that exactly; once the limiter's
+# budget for those is spent, sleeping for the recent average verify time
+# keeps the timing without spending CPU.
+_dummy_hash: str | None = None
+_verify_seconds: float | None = None  # moving average, including pool queueing
+
+
+def _observe_verify(elapsed: float) -> None:
+    global _verify_seconds
+    _verify_seconds = elapsed if _verify_seconds is None else 0.9 * _verify_seconds + 0.1 * elapsed
+
+
+async def warm_dummy_hash() -> None:
+    global _dummy_hash
+    if _dummy_hash is None:
+        started = time.perf_counter()
+        _dummy_hash = await hashing_pool.run(hash_password, secrets.token_urlsafe(16))
+        if _verify_seconds is None:
+            _observe_verify(time.perf_counter() - started)
+
+
+async def verify_missing_user(plain_password: str, spend_cpu: bool = True) -> bool:
+    if spend_cpu or _verify_seconds is None:
+        await warm_dummy_hash()
+        await verify_password_async(plain_password, _dummy_hash)
+    else:
+        await asyncio.sleep(_verify_seconds)
+    return False
+
+
 def create_access_token(data: dict, expires_minutes: int = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(
         minutes=expires_minutes or settings.access_token_expire_minutes
     )
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.jwt_secret, algorithm=ALGORITHM)
+    if keyring.enabled:
+        key = keyring.signing_key()
+        return jwt.encode(to_encode, key.private, algorithm=key.algorithm, headers={"kid": key.kid})
+    return jwt.encode(to_encode, _hmac_key, algorithm=ALGORITHM)
+
+
+def create_user_access_token(user: User, expires_minutes: int = None) -> str:
+    # Embed the identity claims needed to build a Principal without a DB lookup
+    return create_access_token(
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "act": user.is_active,
+            "tfa": user.is_2fa_enabled,
+            "ver": user.token_version or 0,
+            # Lets a single token be revoked (logout)
+            "jti": secrets.token_urlsafe(12),
+        },
+        expires_minutes=expires_minutes,
+    )
 
 
 def decode_access_token(token: str) -> dict | None:
+    # Tokens with a kid are verified with that key's algorithm only; tokens
+    # without one are legacy HS256 tokens
     try:
-        return jwt.decode(token, settings.jwt_secret, algorithms=[ALGORITHM])
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is not None:
+            key = keyring.verification_key(kid) if keyring.enabled else None
+            if key is None:
+                return None
+            return jwt.decode(token, key.public, algorithms=[key.algorithm])
+        if keyring.enabled and not settings.jwt_accept_legacy_hs256:
+            return None
+        return jwt.decode(token, _hmac_key, algorithms=[ALGORITHM])
     except JWTError:
         return None
 
+def hash_refresh_token(refresh_token: str) -> str:
+    # Refresh tokens are high-entropy random strings, so a plain SHA-256 is
+    # enough to keep stolen database rows from being usable
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
 async def validate_refresh_token(session: AsyncSession, refresh_token: str):
     from app.db.crud_user import get_refresh_token
     token_obj = await get_refresh_token(session, refresh_token)
@@ -62,20 +199,49 @@ async def issue_access_token_from_refresh(session: AsyncSession, refresh_token:
     user = result.scalar_one_or_none()
     if not user:
         return None
-    return create_access_token(data={"sub": user.email})
+    return create_user_access_token(user)
+
+class _CachedKeySigner(TimestampSigner):
+    # itsdangerous builds a signer and re-derives its key (a digest over salt
+    # and secret) on every dumps/loads; the key only depends on these inputs
+    _derived_keys: dict[tuple, bytes] = {}
+
+    def derive_key(self, secret_key: str | bytes | None = None) -> bytes:
+        secret_key = self.secret_keys[-1] if secret_key is None else want_bytes(secret_key)
+        cache_key = (secret_key, self.salt, self.key_derivation, self.digest_method)
+        key = self._derived_keys.get(cache_key)
+        if key is None:
+            key = self._derived_keys[cache_key] = super().derive_key(secret_key)
+        return key
+
+
+class _WindowedSigner(_CachedKeySigner):
+    # Timestamps are rounded down to the reuse window, so every worker mints
+    # the same token for the same email within a window. Such a token expires
+    # up to one window early.
+    window = settings.email_verification_token_window_seconds
+
+    def sign(self, value: str | bytes) -> bytes:
+        # TimestampSigner.sign with the rounded timestamp; unsign keeps using
+        # the real time for the age check
+        now = self.get_timestamp()
+        timestamp = base64_encode(int_to_bytes(now - now % self.window if self.window > 0 else now))
+        sep = want_bytes(self.sep)
+        value = want_bytes(value) + sep + timestamp
+        return value + sep + self.get_signature(value)
+
 
 RESET_PASSWORD_SECRET = settings.jwt_secret  # Or a separate secret if you want
 RESET_PASSWORD_SALT = "reset-password"
 RESET_PASSWORD_EXPIRATION = 3600  # 1 hour
+_reset_serializer = URLSafeTimedSerializer(RESET_PASSWORD_SECRET, salt=RESET_PASSWORD_SALT, signer=_CachedKeySigner)
 
 def generate_password_reset_token(email: str) -> str:
-    serializer = URLSafeTimedSerializer(RESET_PASSWORD_SECRET)
-    return serializer.dumps(email, salt=RESET_PASSWORD_SALT)
+    return _reset_serializer.dumps(email)
 
 def verify_password_reset_token(token: str, max_age: int = RESET_PASSWORD_EXPIRATION) -> str | None:
-    serializer = URLSafeTimedSerializer(RESET_PASSWORD_SECRET)
     try:
-        email = serializer.loads(token, salt=RESET_PASSWORD_SALT, max_age=max_age)
+        email = _reset_serializer.loads(token, max_age=max_age)
         return email
     except (BadSignature, SignatureExpired):
         return None
@@ -83,26 +249,20 @@ def verify_password_reset_token(token: str, max_age: int = RESET_PASSWORD_EXPIRA
 EMAIL_VERIFICATION_SECRET = settings.jwt_secret  # Or a separate secret if you want
 EMAIL_VERIFICATION_SALT = "verify-email"
 EMAIL_VERIFICATION_EXPIRATION = 3600 * 24  # 24 hours
+_verification_serializer = URLSafeTimedSerializer(EMAIL_VERIFICATION_SECRET, salt=EMAIL_VERIFICATION_SALT, signer=_WindowedSigner)
 
 def generate_email_verification_token(email: str) -> str:
-    serializer = URLSafeTimedSerializer(EMAIL_VERIFICATION_SECRET)
-    return serializer.dumps(email, salt=EMAIL_VERIFICATION_SALT)
+    # Idempotent within EMAIL_VERIFICATION_TOKEN_WINDOW_SECONDS
+    return _verification_serializer.dumps(email)
 
 def verify_email_verification_token(token: str, max_age: int = EMAIL_VERIFICATION_EXPIRATION) -> str | None:
-    serializer = URLSafeTimedSerializer(EMAIL_VERIFICATION_SECRET)
     try:
-        email = serializer.loads(token, salt=EMAIL_VERIFICATION_SALT, max_age=max_age)
+        email = _verification_serializer.loads(token, max_age=max_age)
         return email
     except (BadSignature, SignatureExpired):
         return None
 
 def send_email(to_email: str, subject: str, body: str):
-    # This is a simple SMTP example. In production, use a robust email library/service.
-    msg = MIMEText(body, "html")
-    msg["Subject"] = subject
-    msg["From"] = f'{settings.email_from_name} <{settings.email_from}>'
-    msg["To"] = to_email
-    with smtplib.SMTP(settings.email_host, settings.email_port) as server:
-        server.starttls()
-        server.login(settings.email_user, settings.email_password)
-        server.sendmail(settings.email_from, [to_email], msg.as_string())
+    # Queued for the background dispatcher (app.core.mailer); never blocks the caller
+    with span("email.enqueue"):
+        email_dispatcher.enqueue(to_email=to_email, subject=subject, body=body)
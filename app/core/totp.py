@@ -0,0 +1,175 @@
+# app/core/totp.py
+
+# 2FA code verification. Decoded TOTP keys are kept in a bounded LRU per user
+# and codes are computed directly with hmac (same algorithm and defaults as
+# pyotp: SHA-1, 6 digits, 30 s steps). Each user's last accepted time step is
+# recorded and a code is only accepted for a later step, so a code can't be
+# replayed within its window. Step stores:
+#   memory - in-process dict (single worker, tests)
+#   redis  - shared across workers; compare-and-set in a Lua script
+
+import base64
+import hashlib
+import hmac
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.core.tracing import span
+
+totp_verifications = Counter("auth_totp_verifications_total", "2FA code verifications by result")
+totp_key_cache = Counter("auth_totp_key_cache_total", "Decoded TOTP key cache lookups by result")
+
+INTERVAL = 30
+DIGITS = 6
+
+
+def decode_secret(secret: str) -> bytes:
+    secret = secret.strip().replace(" ", "").upper()
+    return base64.b32decode(secret + "=" * (-len(secret) % 8))
+
+
+def hotp(key: bytes, counter: int) -> str:
+    digest = hmac.new(key, struct.pack(">Q", counter), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    code = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(code % 10 ** DIGITS).zfill(DIGITS)
+
+
+class StepStore:
+    async def accept(self, user_id: int, step: int) -> bool:
+        # Records step as the user's last accepted one if it is newer than the
+        # stored one; returns False (replay) otherwise
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStepStore(StepStore):
+    def __init__(self, max_users: int = 100000):
+        self.max_users = max_users
+        self._steps: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    async def accept(self, user_id: int, step: int) -> bool:
+        with self._lock:
+            if self._steps.get(user_id, -1) >= step:
+                return False
+            self._steps[user_id] = step
+            if len(self._steps) > self.max_users:
+                # Steps older than any code still inside a verify window can go
+                horizon = int(time.time()) // INTERVAL - settings.totp_valid_window - 1
+                self._steps = {uid: s for uid, s in self._steps.items() if s >= horizon}
+            return True
+
+
+_ACCEPT_SCRIPT = """
+local last = tonumber(redis.call('GET', KEYS[1]) or '-1')
+local step = tonumber(ARGV[1])
+if last >= step then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+class RedisStepStore(StepStore):
+    def __init__(self, url: str, prefix: str = "totp-step:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("TOTP_REPLAY_BACKEND=redis requires the 'redis' package") from exc
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._accept = self._client.register_script(_ACCEPT_SCRIPT)
+
+    async def accept(self, user_id: int, step: int) -> bool:
+        ttl = INTERVAL * (2 * settings.totp_valid_window + 2)
+        return bool(await self._accept(keys=[f"{self.prefix}{user_id}"], args=[step, ttl]))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class TOTPVerifier:
+    def __init__(self, store: StepStore, cache_size: int, valid_window: int = 0):
+        self.store = store
+        self.cache_size = cache_size
+        self.valid_window = valid_window
+        # user_id -> (secret, decoded key)
+        self._keys: OrderedDict[int, tuple[str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, user_id: int, secret: str) -> bytes:
+        with self._lock:
+            entry = self._keys.get(user_id)
+            if entry is not None and entry[0] == secret:
+                self._keys.move_to_end(user_id)
+                totp_key_cache.inc(result="hit")
+                return entry[1]
+        totp_key_cache.inc(result="miss")
+        key = decode_secret(secret)
+        with self._lock:
+            self._keys[user_id] = (secret, key)
+            self._keys.move_to_end(user_id)
+            while len(self._keys) > self.cache_size:
+                self._keys.popitem(last=False)
+        return key
+
+    def match(self, user_id: int, secret: str, code: str, for_time: float = None) -> int | None:
+        # Returns the time step the code belongs to, or None. No replay check.
+        code = (code or "").strip()
+        if len(code) != DIGITS or not code.isdigit():
+            return None
+        key = self._key(user_id, secret)
+        current = int(time.time() if for_time is None else for_time) // INTERVAL
+        for step in range(current - self.valid_window, current + self.valid_window + 1):
+            if hmac.compare_digest(hotp(key, step), code):
+                return step
+        return None
+
+    async def verify(self, user_id: int, secret: str, code: str) -> bool:
+        # Accepts each code at most once per user
+        with span("totp.verify") as attributes:
+            step = self.match(user_id, secret, code)
+            if step is None:
+                result = "invalid"
+            elif not await self.store.accept(user_id, step):
+                result = "replay"
+            else:
+                result = "ok"
+            attributes["result"] = result
+        totp_verifications.inc(result=result)
+        return result == "ok"
+
+    async def batch_verify(self, items: list[tuple[int, str, str]], consume: bool = False) -> list[bool]:
+        # For admin tooling: checks (user_id, secret, code) triples. Codes are
+        # only marked as used when consume is True.
+        if consume:
+            return [await self.verify(user_id, secret, code) for user_id, secret, code in items]
+        now = time.time()
+        return [self.match(user_id, secret, code, for_time=now) is not None for user_id, secret, code in items]
+
+    def forget(self, user_id: int) -> None:
+        with self._lock:
+            self._keys.pop(user_id, None)
+
+
+def create_step_store(backend: str) -> StepStore:
+    if backend == "memory":
+        return MemoryStepStore()
+    if backend == "redis":
+        return RedisStepStore(settings.totp_redis_url)
+    raise ValueError(f"Unknown TOTP replay backend: {backend}")
+
+
+totp_verifier = TOTPVerifier(
+    store=create_step_store(settings.totp_replay_backend),
+    cache_size=settings.totp_cache_size,
+    valid_window=settings.totp_valid_window,
+)
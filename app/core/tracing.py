@@ -0,0 +1,335 @@
+# app/core/tracing.py
+
+# Per-request tracing. With TRACING_ENABLED every request gets a trace and the
+# hot paths add spans to it: SQL statements (app.db.instrumentation), password
+# hashing and verification (app.core.hashing), TOTP verification, email
+# queueing, response rendering and QR rendering. SMTP sends happen in
+# background tasks and are traced on their own. Recording a span is a list
+# append; whether a trace is exported is decided when it ends: sampled
+# (TRACE_SAMPLE_RATE), slower than TRACE_SLOW_MS, or asked for with
+# "X-Trace: 1" plus a valid X-Admin-Token ("X-Trace: profile" also attaches a
+# sampling profile, see app.core.profiler). An incoming W3C traceparent
+# header is continued.
+#
+# Exporters run on a background thread:
+#   file - one JSON object per trace appended to TRACE_FILE
+#   otlp - OTLP/HTTP JSON posted to TRACE_OTLP_ENDPOINT + /v1/traces, which
+#          any OpenTelemetry collector accepts
+#
+# The event-loop monitor measures how late a periodic timer fires. Lag goes
+# to a histogram and, past LOOP_BLOCK_THRESHOLD_MS, is added as a
+# "loop.blocked" span to every trace in flight.
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram
+from app.core.profiler import SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+loop_lag_seconds = Histogram(
+    "auth_event_loop_lag_seconds", "How late the event-loop monitor's timer fired",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+loop_blocked_seconds = Counter("auth_event_loop_blocked_seconds_total", "Event-loop lag above LOOP_BLOCK_THRESHOLD_MS")
+traces_exported = Counter("auth_traces_exported_total", "Traces handed to the exporter, by reason")
+traces_dropped = Counter("auth_traces_dropped_total", "Traces dropped because the export queue was full")
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    start: float  # epoch seconds
+    duration: float
+    attributes: dict
+    span_id: str = field(default_factory=lambda: os.urandom(8).hex())
+
+
+class Trace:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "duration", "spans", "attributes", "force", "profile")
+
+    def __init__(self, name: str, force: bool = False, traceparent: str | None = None):
+        match = _TRACEPARENT.match(traceparent or "")
+        self.trace_id = match.group(1) if match else os.urandom(16).hex()
+        self.parent_id = match.group(2) if match else None
+        self.span_id = os.urandom(8).hex()
+        self.name = name
+        self.start = time.time()
+        self.duration = 0.0
+        self.spans: list[Span] = []
+        self.attributes: dict = {}
+        self.force = force
+        self.profile: collections.Counter | None = None
+
+
+current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("current_trace", default=None)
+
+
+def record_span(name: str, started: float, duration: float, **attributes) -> None:
+    # started is a time.perf_counter() value
+    trace = current_trace.get()
+    if trace is not None:
+        trace.spans.append(Span(name, time.time() - (time.perf_counter() - started), duration, attributes))
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    if current_trace.get() is None:
+        yield attributes
+        return
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as exc:
+        attributes["error"] = type(exc).__name__
+        raise
+    finally:
+        record_span(name, started, time.perf_counter() - started, **attributes)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _nanos(seconds: float) -> str:
+    return str(int(seconds * 1e9))
+
+
+class TraceExporter:
+    def __init__(self, kind: str, path: str, endpoint: str, service: str, profile_dir: str, max_queue: int = 1000):
+        if kind not in ("file", "otlp"):
+            raise ValueError(f"Unknown trace exporter: {kind}")
+        self.kind = kind
+        self.path = path
+        self.endpoint = endpoint.rstrip("/") + "/v1/traces"
+        self.service = service
+        self.profile_dir = profile_dir
+        self._queue: queue.Queue[Trace | None] = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+
+    def submit(self, trace: Trace) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            traces_dropped.inc()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Collect whatever else is queued, up to a second's worth
+            deadline = time.monotonic() + 1.0
+            while batch[-1] is not None and len(batch) < 100:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            traces = [trace for trace in batch if trace is not None]
+            try:
+                for trace in traces:
+                    if trace.profile:
+                        self._write_profile(trace)
+                if traces:
+                    self._export(traces)
+            except Exception:
+                logger.exception("Trace export failed")
+            if stop:
+                return
+
+    def _write_profile(self, trace: Trace) -> None:
+        # Folded stacks, for flamegraph.pl / speedscope
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{trace.trace_id}.folded")
+        with open(path, "w") as f:
+            for stack, count in trace.profile.most_common():
+                f.write(f"{stack} {count}\n")
+        trace.attributes["profile.path"] = path
+
+    def _export(self, traces: list[Trace]) -> None:
+        if self.kind == "file":
+            with open(self.path, "a") as f:
+                for trace in traces:
+                    f.write(json.dumps({
+                        "trace_id": trace.trace_id,
+                        "name": trace.name,
+                        "start": trace.start,
+                        "duration_ms": round(trace.duration * 1000, 3),
+                        "attributes": trace.attributes,
+                        "spans": [
+                            {
+                                "name": s.name,
+                                "offset_ms": round((s.start - trace.start) * 1000, 3),
+                                "duration_ms": round(s.duration * 1000, 3),
+                                **({"attributes": s.attributes} if s.attributes else {}),
+                            }
+                            for s in trace.spans
+                        ],
+                    }) + "\n")
+            return
+        spans = []
+        for trace in traces:
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": trace.span_id,
+                **({"parentSpanId": trace.parent_id} if trace.parent_id else {}),
+                "name": trace.name,
+                "kind": 2,  # server
+                "startTimeUnixNano": _nanos(trace.start),
+                "endTimeUnixNano": _nanos(trace.start + trace.duration),
+                "attributes": _otlp_attributes(trace.attributes),
+            })
+            spans.extend({
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": trace.span_id,
+                "name": s.name,
+                "kind": 1,  # internal
+                "startTimeUnixNano": _nanos(s.start),
+                "endTimeUnixNano": _nanos(s.start + s.duration),
+                "attributes": _otlp_attributes(s.attributes),
+            } for s in trace.spans)
+        body = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service})},
+            "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+        }]}).encode()
+        request = urllib.request.Request(self.endpoint, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+
+
+class Tracer:
+    def __init__(self, enabled: bool, sample_rate: float, slow_seconds: float, exporter: TraceExporter | None,
+                 profiler: SamplingProfiler | None, profile_sample_rate: float, profile_slowest_percent: float):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.exporter = exporter
+        self.profiler = profiler
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_slowest_percent = profile_slowest_percent
+        # Traces in flight, for the loop monitor
+        self.active: set[Trace] = set()
+        # Recent request durations; profiles are kept for the slowest N%
+        self._durations: collections.deque[float] = collections.deque(maxlen=1000)
+        self._profile_threshold = 0.0
+
+    def begin(self, name: str, force: bool = False, profile: bool = False, traceparent: str | None = None):
+        trace = Trace(name, force=force, traceparent=traceparent)
+        if self.profiler is not None and (profile or random.random() < self.profile_sample_rate):
+            trace.profile = self.profiler.start(trace)
+        self.active.add(trace)
+        return trace, current_trace.set(trace)
+
+    def end(self, trace: Trace, token, **attributes) -> None:
+        current_trace.reset(token)
+        self.active.discard(trace)
+        trace.duration = time.time() - trace.start
+        trace.attributes.update(attributes)
+        if trace.profile is not None:
+            self.profiler.stop(trace)
+            if not trace.force and trace.duration < self._update_profile_threshold(trace.duration):
+                trace.profile = None
+        elif self.profiler is not None:
+            self._update_profile_threshold(trace.duration)
+        if trace.force:
+            reason = "forced"
+        elif trace.duration >= self.slow_seconds:
+            reason = "slow"
+        elif trace.profile:
+            reason = "profiled"
+        elif random.random() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return
+        traces_exported.inc(reason=reason)
+        self.exporter.submit(trace)
+
+    def _update_profile_threshold(self, duration: float) -> float:
+        self._durations.append(duration)
+        if len(self._durations) % 100 == 0 or not self._profile_threshold:
+            ordered = sorted(self._durations)
+            index = min(len(ordered) - 1, int(len(ordered) * (1 - self.profile_slowest_percent / 100)))
+            self._profile_threshold = ordered[index]
+        return self._profile_threshold
+
+    @contextlib.asynccontextmanager
+    async def background(self, name: str, **attributes):
+        # Traces work outside a request (email batches); exported by the same rules
+        if not self.enabled:
+            yield None
+            return
+        trace, token = self.begin(name)
+        try:
+            yield trace
+        finally:
+            self.end(trace, token, **attributes)
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+async def run_loop_monitor(interval: float, threshold: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        loop_lag_seconds.observe(lag)
+        if lag >= threshold:
+            loop_blocked_seconds.inc(lag)
+            blocked = Span("loop.blocked", time.time() - lag, lag, {})
+            for trace in list(tracer.active):
+                trace.spans.append(blocked)
+
+
+tracer = Tracer(
+    enabled=settings.tracing_enabled,
+    sample_rate=settings.trace_sample_rate,
+    slow_seconds=settings.trace_slow_ms / 1000,
+    exporter=TraceExporter(
+        kind=settings.trace_exporter,
+        path=settings.trace_file,
+        endpoint=settings.trace_otlp_endpoint,
+        service=settings.trace_service_name,
+        profile_dir=settings.profile_dir,
+    ) if settings.tracing_enabled else None,
+    profiler=SamplingProfiler(settings.profile_interval_ms / 1000) if settings.tracing_enabled else None,
+    profile_sample_rate=settings.profile_sample_rate,
+    profile_slowest_percent=settings.profile_slowest_percent,
+)
@@ -0,0 +1,124 @@
+# app/core/warmup.py
+
+# Work a worker does before it reports ready (GET /health/ready): opens the
+# pooled primary connections, starts the hashing workers and computes the
+# dummy hash used for unknown-account logins, and parses a phone number so
+# phonenumbers loads its region metadata before the first registration. It
+# runs in the background after startup so the worker binds its socket right
+# away; failures (database not up yet) are retried. Replica pools are warmed
+# afterwards on a best-effort basis and don't hold readiness back.
+#
+# On SIGTERM the worker fails readiness first and keeps serving for
+# SHUTDOWN_DRAIN_SECONDS, so the balancer stops routing to it before the
+# server closes its socket; then the signal goes to the server's own handler.
+# A second SIGTERM stops right away.
+
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.metrics import Gauge
+from app.core.phone import to_e164
+from app.core.security import warm_dummy_hash
+from app.db.instrumentation import InstrumentedQueuePool
+from app.db.session import engine, replicas
+
+logger = logging.getLogger(__name__)
+
+worker_ready = Gauge("auth_worker_ready", "1 once startup warmup has finished and the worker is not draining")
+warmup_seconds = Gauge("auth_warmup_seconds", "Time the last successful warmup took")
+
+
+async def _warm_engine(target: AsyncEngine, connections: int) -> None:
+    # Concurrent checkouts, so the pool opens that many connections
+    if not isinstance(target.sync_engine.pool, InstrumentedQueuePool):
+        connections = 1
+
+    async def ping() -> None:
+        async with target.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+class Warmup:
+    def __init__(self, connections: int, retry_seconds: float = 2.0):
+        self.connections = connections
+        self.retry_seconds = retry_seconds
+        self.ready = False
+        self.draining = False
+
+    async def run(self) -> None:
+        # Readiness waits on the primary and hashing only; reads fall back to
+        # the primary, so a replica that is down must not keep the worker out
+        while True:
+            started = time.perf_counter()
+            try:
+                await asyncio.gather(
+                    _warm_engine(engine, self.connections),
+                    warm_dummy_hash(),
+                    asyncio.to_thread(to_e164, "+12025550123"),
+                )
+            except Exception as exc:
+                logger.warning("Warmup failed, retrying in %.0f s: %s: %s", self.retry_seconds, type(exc).__name__, exc)
+                await asyncio.sleep(self.retry_seconds)
+                continue
+            self.ready = True
+            worker_ready.set(0 if self.draining else 1)
+            warmup_seconds.set(time.perf_counter() - started)
+            logger.info("Worker ready after %.2f s of warmup", time.perf_counter() - started)
+            break
+        await asyncio.gather(*(self._warm_replica(index) for index in range(len(replicas.engines))))
+
+    async def _warm_replica(self, index: int) -> None:
+        # Best effort: a replica that fails is evicted until the health check re-admits it
+        try:
+            await asyncio.wait_for(
+                _warm_engine(replicas.engines[index], self.connections), timeout=settings.db_pool_timeout,
+            )
+        except Exception as exc:
+            logger.warning("Replica %s warmup failed: %s: %s", replicas.names[index], type(exc).__name__, exc)
+            replicas.set_health(index, False)
+
+    def drain(self) -> None:
+        # Fail readiness while shutting down so the balancer stops sending traffic
+        self.draining = True
+        worker_ready.set(0)
+
+    def install_sigterm_drain(self, grace_seconds: float):
+        # Wraps the handler the server installed (uvicorn does so before the
+        # lifespan starts); returns a callable restoring it
+        if grace_seconds <= 0 or threading.current_thread() is not threading.main_thread():
+            return lambda: None
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def forward() -> None:
+            signal.signal(signal.SIGTERM, previous)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        def handle(signum, frame) -> None:
+            if self.draining:
+                loop.call_soon_threadsafe(forward)
+                return
+            self.drain()
+            logger.info("SIGTERM: draining for %.1f s before shutdown", grace_seconds)
+            loop.call_soon_threadsafe(loop.call_later, grace_seconds, forward)
+
+        signal.signal(signal.SIGTERM, handle)
+
+        def restore() -> None:
+            if signal.getsignal(signal.SIGTERM) is handle:
+                signal.signal(signal.SIGTERM, previous)
+
+        return restore
+
+
+warmup = Warmup(connections=settings.db_pool_warm_connections or settings.db_pool_size)
@@ -0,0 +1,81 @@
+# app/db/crud_email.py
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.security import send_email
+from app.core.tracing import span
+from app.db.models import EmailOutbox
+
+# dedupe_key -> expiry, for direct sends when the outbox is disabled (per worker)
+_recent_direct: dict[str, float] = {}
+
+
+def _direct_duplicate(dedupe_key: str) -> bool:
+    now = time.monotonic()
+    if len(_recent_direct) > 10000:
+        for key in [key for key, expires in _recent_direct.items() if expires <= now]:
+            del _recent_direct[key]
+    if _recent_direct.get(dedupe_key, 0) > now:
+        return True
+    _recent_direct[dedupe_key] = now + settings.email_dedupe_window_seconds
+    return False
+
+
+async def queue_email(
+    session: AsyncSession,
+    to_email: str,
+    subject: str,
+    body: str,
+    dedupe_key: str | None = None,
+) -> bool:
+    # Adds the message to the outbox in the caller's transaction; it is only
+    # sent once the caller commits. Returns False when an identical message
+    # (same dedupe_key) was already queued within the dedupe window. The
+    # SELECT covers the sliding window; the unique (dedupe_key, bucket) index
+    # makes concurrent requests agree (the loser inserts nothing).
+    with span("email.queue", outbox=settings.email_outbox_enabled) as attributes:
+        if not settings.email_outbox_enabled:
+            if dedupe_key is not None and _direct_duplicate(dedupe_key):
+                attributes["duplicate"] = True
+                return False
+            send_email(to_email=to_email, subject=subject, body=body)
+            return True
+        if dedupe_key is None:
+            session.add(EmailOutbox(to_email=to_email, subject=subject, body=body))
+            return True
+        window = max(settings.email_dedupe_window_seconds, 1)
+        since = datetime.now(timezone.utc) - timedelta(seconds=window)
+        recent = await session.scalar(
+            select(EmailOutbox.id)
+            .where(EmailOutbox.dedupe_key == dedupe_key, EmailOutbox.created_at >= since)
+            .limit(1)
+        )
+        inserted = None
+        if recent is None:
+            stmt = _insert_for(session).values(
+                to_email=to_email, subject=subject, body=body,
+                dedupe_key=dedupe_key, dedupe_bucket=int(time.time()) // window,
+            )
+            inserted = await session.scalar(
+                stmt.on_conflict_do_nothing(index_elements=["dedupe_key", "dedupe_bucket"]).returning(EmailOutbox.id)
+            )
+        if inserted is None:
+            attributes["duplicate"] = True
+            return False
+        return True
+
+
+def _insert_for(session: AsyncSession):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"Email dedupe does not support {dialect}")
+    return dialect_insert(EmailOutbox)
@@ -1,49 +1,149 @@
 # app/db/crud_user.py
 
-from sqlalchemy import select
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import User, RefreshToken
-from app.core.security import hash_password
+from app.core.security import hash_password_async, hash_refresh_token
+from app.core.config import settings
+from app.core.phone import to_e164
+from app.db.user_cache import user_cache, attach
 import secrets
 
 
 async def get_user_by_email(session: AsyncSession, email: str) -> User | None:
+    if settings.user_cache_enabled:
+        row = user_cache.get_by_email(email)
+        if row is not None:
+            return await attach(session, row)
     stmt = select(User).where(User.email == email)
     result = await session.execute(stmt)
-    return result.scalar_one_or_none()
+    user = result.scalar_one_or_none()
+    if user is not None and settings.user_cache_enabled:
+        user_cache.put(user)
+    return user
 
 
-async def create_user(session: AsyncSession, email: str, password: str,fname:str,lname:str,phone:str) -> User:
+async def get_user_by_id(session: AsyncSession, user_id: int) -> User | None:
+    if settings.user_cache_enabled:
+        row = user_cache.get_by_id(user_id)
+        if row is not None:
+            return await attach(session, row)
+    user = await session.get(User, user_id)
+    if user is not None and settings.user_cache_enabled:
+        user_cache.put(user)
+    return user
+
+
+# The write helpers below only flush: they take part in the caller's
+# transaction and the endpoint commits once.
+
+async def create_user(session: AsyncSession, email: str, password: str,fname:str,lname:str,phone:str, is_verified: bool = False) -> User:
     user = User(
         email=email,
-        hashed_pw=hash_password(password),
+        hashed_pw=await hash_password_async(password),
         fname=fname,
         lname=lname,
-        phone=phone
+        phone=phone,
+        phone_e164=to_e164(phone),
+        is_verified=is_verified,
     )
     session.add(user)
-    await session.commit()
-    await session.refresh(user)
+    # Assigns the id (and server defaults) via RETURNING
+    await session.flush()
     return user
 
 
-async def create_refresh_token(session: AsyncSession, user_id: int) -> RefreshToken:
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _new_refresh_token(user_id: int) -> RefreshToken:
     token_value = secrets.token_urlsafe(64)
-    refresh_token = RefreshToken(user_id=user_id, token=token_value)
+    refresh_token = RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token_value),
+        expires_at=_utcnow() + timedelta(days=settings.refresh_token_expire_days),
+        revoked=False,
+    )
+    refresh_token.token = token_value
+    return refresh_token
+
+
+async def create_refresh_token(session: AsyncSession, user_id: int) -> RefreshToken:
+    refresh_token = _new_refresh_token(user_id)
     session.add(refresh_token)
-    await session.commit()
-    await session.refresh(refresh_token)
+    await session.flush()
     return refresh_token
 
 async def get_refresh_token(session: AsyncSession, token: str) -> RefreshToken | None:
-    stmt = select(RefreshToken).where(RefreshToken.token == token, RefreshToken.revoked == False)
+    stmt = select(RefreshToken).where(
+        RefreshToken.token_hash == hash_refresh_token(token),
+        RefreshToken.revoked == False,
+        RefreshToken.expires_at > _utcnow(),
+    )
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
 async def revoke_refresh_token(session: AsyncSession, token: str) -> None:
-    stmt = select(RefreshToken).where(RefreshToken.token == token)
-    result = await session.execute(stmt)
-    refresh_token = result.scalar_one_or_none()
-    if refresh_token:
-        refresh_token.revoked = True
-        await session.commit()
+    await session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.token_hash == hash_refresh_token(token), RefreshToken.revoked == False)
+        .values(revoked=True, revoked_at=_utcnow(), revoked_reason="logout")
+        .execution_options(synchronize_session=False)
+    )
+
+
+class RefreshTokenReused(Exception):
+    pass
+
+
+async def rotate_refresh_token(session: AsyncSession, token: str) -> tuple[User, RefreshToken] | None:
+    # Revoke the presented token and issue its successor in one transaction.
+    # The conditional UPDATE is the lock: of two concurrent rotations only one
+    # gets a row back. On PostgreSQL the user row comes back in the same
+    # statement; SQLite cannot return joined columns, so the user is loaded by
+    # id (a second query unless USER_CACHE_ENABLED).
+    token_hash = hash_refresh_token(token)
+    revoke = (
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > _utcnow(),
+        )
+        .values(revoked=True, revoked_at=_utcnow(), revoked_reason="rotated")
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        stmt = select(User).from_statement(
+            revoke.where(RefreshToken.user_id == User.id).returning(*User.__table__.c)
+        ).execution_options(synchronize_session=False)
+        user = (await session.execute(stmt)).scalar_one_or_none()
+    else:
+        user_id = (await session.execute(revoke.returning(RefreshToken.user_id))).scalar_one_or_none()
+        user = await get_user_by_id(session, user_id) if user_id is not None else None
+
+    if user is None:
+        # A token that was already rotated means it was replayed: treat it as
+        # stolen and revoke the whole family. Logged-out tokens (and rows
+        # revoked before reasons were recorded) are just invalid.
+        owner_id = await session.scalar(
+            select(RefreshToken.user_id).where(
+                RefreshToken.token_hash == token_hash, RefreshToken.revoked_reason == "rotated",
+            )
+        )
+        if owner_id is not None:
+            await session.execute(
+                update(RefreshToken)
+                .where(RefreshToken.user_id == owner_id, RefreshToken.revoked == False)
+                .values(revoked=True, revoked_at=_utcnow(), revoked_reason="reuse")
+            )
+            await session.commit()
+            raise RefreshTokenReused()
+        await session.rollback()
+        return None
+
+    successor = _new_refresh_token(user.id)
+    session.add(successor)
+    await session.commit()
+    return user, successor
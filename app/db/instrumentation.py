@@ -0,0 +1,91 @@
+# app/db/instrumentation.py
+
+# Connection pool and query instrumentation: checkout wait times, in-use /
+# idle connection counts, query latency, slow-query logging and disconnect
+# counts, all labelled by engine name. Statements are also recorded as spans
+# on the current request trace.
+
+import logging
+import time
+
+from sqlalchemy import event, exc as sa_exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+from app.core.tracing import record_span
+
+logger = logging.getLogger("app.db.slow_query")
+
+pool_checkout_wait = Histogram("auth_db_pool_checkout_wait_seconds", "Time spent waiting to check out a pooled connection")
+pool_in_use = Gauge("auth_db_pool_in_use", "Connections checked out of the pool")
+pool_idle = Gauge("auth_db_pool_idle", "Idle connections in the pool")
+pool_overflow = Gauge("auth_db_pool_overflow", "Connections opened beyond pool_size")
+pool_timeouts = Counter("auth_db_pool_timeouts_total", "Checkouts that gave up waiting for a connection")
+db_query_seconds = Histogram("auth_db_query_seconds", "SQL statement execution time")
+db_slow_queries = Counter("auth_db_slow_queries_total", "Statements slower than DB_SLOW_QUERY_MS")
+db_disconnects = Counter("auth_db_disconnects_total", "Statements that failed on a dead connection (pool invalidated)")
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # Records how long each checkout waits, including overflow creation.
+    # The engine name is attached by instrument_engine().
+    engine_name = "primary"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except sa_exc.TimeoutError:
+            pool_timeouts.inc(engine=self.engine_name)
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started, engine=self.engine_name)
+
+
+def _update_pool_gauges(pool, name: str, returning: int = 0) -> None:
+    # "checkin" fires before the connection is back in the queue, so the
+    # caller passes returning=1 to count it as idle already
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        pool_in_use.set(pool.checkedout() - returning, engine=name)
+        pool_idle.set(pool.checkedin() + returning, engine=name)
+        pool_overflow.set(max(pool.overflow(), 0), engine=name)
+
+
+def instrument_engine(sync_engine: Engine, name: str = "primary") -> None:
+    pool = sync_engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.engine_name = name
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _update_pool_gauges(pool, name)
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        _update_pool_gauges(pool, name, returning=1)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        elapsed = time.perf_counter() - started
+        db_query_seconds.observe(elapsed, engine=name)
+        record_span("db.query", started, elapsed, engine=name, statement=statement[:200])
+        if elapsed * 1000 >= settings.db_slow_query_ms:
+            db_slow_queries.inc(engine=name)
+            logger.warning("Slow query on %s (%.1f ms): %s", name, elapsed * 1000, " ".join(statement.split())[:500])
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        if context.is_disconnect:
+            # SQLAlchemy invalidates the whole pool on disconnect, which
+            # replaces per-checkout pre-ping round trips
+            db_disconnects.inc(engine=name)
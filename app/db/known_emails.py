@@ -0,0 +1,219 @@
+# app/db/known_emails.py
+
+# Bloom filter of registered emails so logins for addresses that don't exist
+# skip the users lookup. The filter is loaded from the users table at
+# startup, updated on commit when a user is created or changes email, topped
+# up from rows written since the last load (users.updated_at, re-reading a
+# trailing window so transactions that commit late aren't missed), and
+# rebuilt periodically to drop stale entries and resize. A "no" is trusted
+# only once the first load has finished; a "maybe" always goes to the
+# database.
+#
+# A false "no" rejects a real user's login, so the filter is off by default
+# unless a cross-worker invalidation backend is configured: with the
+# in-process bus, other workers would only learn a new email at the next
+# refresh (KNOWN_EMAILS_REFRESH_SECONDS).
+
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+from datetime import timedelta
+
+from sqlalchemy import and_, event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.invalidation import bus
+from app.core.metrics import Counter, Gauge
+from app.db.models import User
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "known-emails"
+
+filter_lookups = Counter("auth_known_emails_lookups_total", "Known-email filter lookups by result")
+filter_entries = Gauge("auth_known_emails_entries", "Emails added to the known-email filter")
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(capacity, 1)
+        self.bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        # Double hashing over one 128-bit digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, value: str) -> None:
+        # Re-adding a member (refresh overlap) doesn't count towards capacity
+        if value in self:
+            return
+        for position in self._positions(value):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class KnownEmails:
+    def __init__(self, enabled: bool, error_rate: float, overlap_seconds: float, batch_size: int = 10000):
+        self.enabled = enabled
+        self.error_rate = error_rate
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.batch_size = batch_size
+        self.ready = False
+        self._filter = BloomFilter(1, error_rate)
+        # Highest users.updated_at loaded so far (database clock)
+        self._watermark = None
+        # Emails committed while a rebuild is loading, replayed into the new filter
+        self._recent: list[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def needs_rebuild(self) -> bool:
+        # Past its capacity the false-positive rate climbs quickly
+        return self._filter.count > self._filter.capacity
+
+    def might_exist(self, email: str) -> bool:
+        if not self.ready:
+            return True
+        with self._lock:
+            found = email in self._filter
+        filter_lookups.inc(result="maybe" if found else "absent")
+        return found
+
+    def add(self, email: str) -> None:
+        with self._lock:
+            self._filter.add(email)
+            if len(self._recent) < 100000:
+                self._recent.append(email)
+            filter_entries.set(self._filter.count)
+
+    async def _load(self, session, bloom: BloomFilter) -> None:
+        after_id = 0
+        while True:
+            rows = (await session.execute(
+                select(User.id, User.email).where(User.id > after_id).order_by(User.id).limit(self.batch_size)
+            )).all()
+            for _, email in rows:
+                bloom.add(email)
+            if rows:
+                after_id = rows[-1][0]
+            if len(rows) < self.batch_size:
+                return
+
+    async def _load_since(self, session, bloom: BloomFilter, since):
+        # Keyset pages over (updated_at, id); returns the highest updated_at
+        watermark, after = since, None
+        while True:
+            query = select(User.id, User.email, User.updated_at).order_by(User.updated_at, User.id).limit(self.batch_size)
+            if after is None:
+                query = query.where(User.updated_at >= since)
+            else:
+                query = query.where(or_(
+                    User.updated_at > after[0], and_(User.updated_at == after[0], User.id > after[1]),
+                ))
+            rows = (await session.execute(query)).all()
+            for _, email, _ in rows:
+                bloom.add(email)
+            if rows:
+                after = (rows[-1][2], rows[-1][0])
+                watermark = max(watermark, rows[-1][2])
+            if len(rows) < self.batch_size:
+                return watermark
+
+    async def rebuild(self, sessionmaker) -> None:
+        # Builds a new filter sized for twice the current user count and swaps
+        # it in; also drops the stale addresses of users who changed email
+        with self._lock:
+            self._recent = []
+        async with sessionmaker() as session:
+            # Taken first: rows written during the load are re-read by the next refresh
+            watermark = await session.scalar(select(func.coalesce(func.max(User.updated_at), func.now())))
+            highest = await session.scalar(select(User.id).order_by(User.id.desc()).limit(1)) or 0
+            bloom = BloomFilter(max(2 * highest, 1024), self.error_rate)
+            await self._load(session, bloom)
+        with self._lock:
+            for email in self._recent:
+                bloom.add(email)
+            self._filter, self._watermark, self.ready = bloom, watermark, True
+            filter_entries.set(bloom.count)
+
+    async def refresh(self, sessionmaker) -> None:
+        # Picks up users created or renamed by other processes since the last
+        # load. updated_at is set when the writing transaction starts
+        # (PostgreSQL now()), so a trailing window is re-read to catch
+        # transactions that committed after a later-started one.
+        with self._lock:
+            bloom, watermark = self._filter, self._watermark
+        if watermark is None:
+            return
+        async with sessionmaker() as session:
+            watermark = await self._load_since(session, bloom, watermark - self.overlap)
+        with self._lock:
+            if bloom is self._filter:
+                self._watermark = max(self._watermark, watermark)
+            filter_entries.set(self._filter.count)
+
+
+known_emails = KnownEmails(
+    # None: on only with a cross-worker invalidation backend (see above)
+    enabled=settings.known_emails_filter_enabled
+    if settings.known_emails_filter_enabled is not None
+    else settings.invalidation_backend != "memory",
+    error_rate=settings.known_emails_error_rate,
+    overlap_seconds=settings.known_emails_overlap_seconds,
+)
+
+
+async def run_known_emails_refresher(sessionmaker) -> None:
+    rebuild_every = max(1, round(settings.known_emails_rebuild_seconds / settings.known_emails_refresh_seconds))
+    ticks = 0
+    while True:
+        try:
+            if ticks % rebuild_every == 0 or known_emails.needs_rebuild:
+                await known_emails.rebuild(sessionmaker)
+            else:
+                await known_emails.refresh(sessionmaker)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Known-email filter refresh failed")
+        ticks += 1
+        await asyncio.sleep(settings.known_emails_refresh_seconds)
+
+
+def _on_known_email(payload: dict) -> None:
+    if payload.get("email"):
+        known_emails.add(payload["email"])
+
+
+bus.subscribe(CHANNEL, _on_known_email)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_new_emails(session, flush_context):
+    pending = session.info.setdefault("known_emails_add", set())
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, User) and (obj in session.new or inspect(obj).attrs.email.history.added):
+            pending.add(obj.email)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_new_emails(session):
+    for email in session.info.pop("known_emails_add", ()):
+        bus.publish(CHANNEL, {"email": email})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_new_emails(session):
+    session.info.pop("known_emails_add", None)
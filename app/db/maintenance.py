@@ -0,0 +1,65 @@
+# app/db/maintenance.py
+
+# Background housekeeping. Every worker may run the purge loop: batches are
+# claimed with SKIP LOCKED on PostgreSQL, so concurrent purgers never wait on
+# each other or on live refresh requests.
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, or_, select
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.db.models import RefreshToken
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+purged_refresh_tokens = Counter("auth_refresh_tokens_purged_total", "Expired or revoked refresh tokens deleted")
+
+
+async def purge_refresh_tokens(batch_size: int = None, pause: float = 0.05) -> int:
+    batch_size = batch_size or settings.refresh_token_purge_batch_size
+    total = 0
+    while True:
+        now = datetime.now(timezone.utc)
+        revoked_cutoff = now - timedelta(days=settings.refresh_token_revoked_retention_days)
+        batch = (
+            select(RefreshToken.id)
+            .where(or_(
+                RefreshToken.expires_at < now,
+                RefreshToken.revoked_at < revoked_cutoff,
+            ))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        # Short transaction per batch keeps row locks brief
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                delete(RefreshToken)
+                .where(RefreshToken.id.in_(batch.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        deleted = result.rowcount or 0
+        total += deleted
+        purged_refresh_tokens.inc(deleted)
+        if deleted < batch_size:
+            return total
+        await asyncio.sleep(pause)
+
+
+async def run_refresh_token_purger(interval: float = None) -> None:
+    interval = interval or settings.refresh_token_purge_interval_seconds
+    while True:
+        try:
+            deleted = await purge_refresh_tokens()
+            if deleted:
+                logger.info("Purged %d refresh tokens", deleted)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Refresh token purge failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,73 @@
+# app/db/migrate.py
+
+# Schema management. The app does not create tables on startup; run this once
+# per deploy, before the new workers start:
+#
+#   python -m app.db.migrate            # upgrade to the latest revision
+#   python -m app.db.migrate --check    # exit status 1 if migrations are pending
+#
+# A thin wrapper around Alembic (alembic.ini at the repository root), so
+# `alembic ...` commands keep working alongside it.
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+def alembic_config() -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # Independent of the working directory
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    return config
+
+
+async def current_revision(url: str) -> tuple[str | None, bool]:
+    # Returns (revision, whether the users table exists)
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            def _inspect(sync_conn):
+                revision = MigrationContext.configure(sync_conn).get_current_revision()
+                return revision, inspect(sync_conn).has_table("users")
+            return await conn.run_sync(_inspect)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply database migrations")
+    parser.add_argument("--check", action="store_true", help="only report whether the schema is up to date")
+    args = parser.parse_args()
+
+    config = alembic_config()
+    head = ScriptDirectory.from_config(config).get_current_head()
+    current, has_tables = asyncio.run(current_revision(settings.db_url))
+    if current is None and has_tables:
+        sys.exit(
+            "Tables exist but carry no migration revision (created by the old startup create_all). "
+            "Run `alembic stamp 0001` once, then migrate."
+        )
+    if args.check:
+        print(f"current={current} head={head}")
+        sys.exit(0 if current == head else 1)
+    if current == head:
+        print(f"Schema is up to date ({head})")
+        return
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 # app/db/models.py
 from datetime import datetime                   # ← add import
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Boolean, Integer, DateTime, func
-from sqlalchemy import ForeignKey
+from sqlalchemy import String, Boolean, Integer, DateTime, Text, func, text
+from sqlalchemy import ForeignKey, Index
 
 
 class Base(DeclarativeBase):
@@ -11,6 +11,9 @@ class Base(DeclarativeBase):
 
 class User(Base):
     __tablename__ = "users"
+    # Server-side defaults come back with the INSERT (RETURNING), so new rows
+    # are complete after a flush without a refresh SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     email: Mapped[str] = mapped_column(String(120), unique=True, index=True, nullable=False)
@@ -18,19 +21,67 @@ class User(Base):
     fname: Mapped[str] = mapped_column(String, nullable=False)
     lname: Mapped[str] = mapped_column(String, nullable=False)
     phone: Mapped[str] = mapped_column(String, nullable=False)
+    # E.164 form of phone, normalized on write (app.core.phone)
+    phone_e164: Mapped[str | None] = mapped_column(String(16), nullable=True, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_verified: Mapped[bool] = mapped_column(Boolean, default=False)
     is_2fa_enabled: Mapped[bool] = mapped_column(Boolean, default=False)
     totp_secret: Mapped[str | None] = mapped_column(String, nullable=True)
+    # Bumped whenever identity claims embedded in access tokens change
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     created_at: Mapped[datetime] = mapped_column(        # ← add explicit type
         DateTime(timezone=True),
         server_default=func.now(),
     )
+    # Set by the database on every write; the known-email filter reloads by it
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True,
+    )
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    token: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    # SHA-256 hex digest of the token; the raw value is never stored
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
     revoked: Mapped[bool] = mapped_column(Boolean, default=False)
+    # When it was revoked; the purge keeps revoked rows for the retention window from here
+    revoked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    # "rotated", "logout" or "reuse"; only reuse of a rotated token revokes the family
+    revoked_reason: Mapped[str | None] = mapped_column(String(16), nullable=True)
+
+    # Raw token value, only set on instances returned by create/rotate
+    token = None
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Workers only scan due, unsent messages
+        Index(
+            "ix_email_outbox_due",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'"),
+        ),
+        # One message per key and window bucket, enforced on insert (ON CONFLICT DO NOTHING)
+        Index("uq_email_outbox_dedupe", "dedupe_key", "dedupe_bucket", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    to_email: Mapped[str] = mapped_column(String(120), nullable=False)
+    subject: Mapped[str] = mapped_column(String, nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    # Messages sharing a key within the dedupe window are only sent once
+    dedupe_key: Mapped[str | None] = mapped_column(String(160), nullable=True)
+    # Epoch seconds // EMAIL_DEDUPE_WINDOW_SECONDS when dedupe_key is set
+    dedupe_bucket: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending", server_default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,338 @@
+# app/db/provisioning.py
+
+# Bulk user provisioning for tenant migrations (CLI: app.workers.import_users,
+# API: POST /admin/users/import).
+#
+# Input is streamed: CSV with a header row (one record per line) or JSON
+# lines, with the fields email, fname, lname, phone and either password or
+# password_hash (any scheme pwd_context recognizes, e.g. bcrypt "$2b$...",
+# stored as-is; deprecated schemes are upgraded on the user's next login).
+# Optional: is_verified, is_active.
+#
+# Validation and hashing run one batch ahead of the writer: the CLI forks a
+# process pool for the run; the API uses the server's shared hashing pool in
+# small chunks, with at most half its workers, so logins keep getting through
+# and concurrent uploads don't each start a pool. Each batch is written in one transaction: COPY into a temp table
+# plus INSERT ... SELECT on PostgreSQL/asyncpg, a multi-row INSERT elsewhere,
+# both with ON CONFLICT (email) DO NOTHING. Existing emails are skipped, so an
+# interrupted import can be re-run; the CLI also checkpoints the number of
+# committed records and resumes after it.
+
+import asyncio
+import csv
+import functools
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+from pydantic.networks import validate_email
+from pydantic_core import PydanticCustomError
+from sqlalchemy import text
+
+from app.core.hashing import HashingPool
+from app.core.metrics import Counter
+from app.core.phone import to_e164
+from app.core.security import hash_password, pwd_context
+from app.db.known_emails import known_emails
+from app.db.models import User
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+import_rows = Counter("auth_user_import_rows_total", "Bulk-imported user records by result")
+
+FORMATS = ("csv", "jsonl")
+_COLUMNS = ("email", "hashed_pw", "fname", "lname", "phone", "phone_e164", "is_active", "is_verified", "is_2fa_enabled")
+_TRUE = {"1", "true", "yes", "y", "t"}
+_MAX_ERRORS = 20
+# Records per job on a shared pool; one job occupies a worker for this many hashes
+_POOL_CHUNK = 8
+# Plain ASCII dot-atom local parts; anything else takes the full validator
+_LOCAL_PART = re.compile(r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*\Z")
+
+
+@dataclass
+class ImportStats:
+    processed: int = 0
+    inserted: int = 0
+    skipped: int = 0  # email already registered (or repeated in the input)
+    rejected: int = 0
+    errors: list[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def rate(self) -> float:
+        return self.processed / max(time.monotonic() - self.started, 1e-9)
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "rejected": self.rejected,
+            "rows_per_second": round(self.rate),
+            "errors": self.errors,
+        }
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[dict | ValueError]:
+    # Yields one dict per record, or a ValueError for a line that can't be parsed
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}")
+    header = None
+    buffer = b""
+
+    def parse(lines: list[bytes]):
+        nonlocal header
+        for line in lines:
+            line = line.decode("utf-8-sig" if header is None else "utf-8").strip()
+            if not line:
+                continue
+            if fmt == "jsonl":
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    yield ValueError(f"invalid JSON: {exc}")
+                    continue
+                yield record if isinstance(record, dict) else ValueError("not a JSON object")
+            elif header is None:
+                header = [name.strip() for name in next(csv.reader([line]))]
+            else:
+                values = next(csv.reader([line]))
+                if len(values) != len(header):
+                    yield ValueError(f"expected {len(header)} columns, got {len(values)}")
+                else:
+                    yield dict(zip(header, values))
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for record in parse(lines):
+            yield record
+    for record in parse([buffer]):
+        yield record
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_domain(domain: str) -> str:
+    return validate_email(f"x@{domain}")[1].rpartition("@")[2]
+
+
+def normalize_email(value: str) -> str:
+    # Same result as EmailStr validation. The domain check (IDNA) is most of
+    # the cost and imports share a handful of domains, so it runs once per
+    # domain.
+    local, at, domain = value.rpartition("@")
+    if at and len(local) <= 64 and len(value) <= 254 and _LOCAL_PART.match(local):
+        return f"{local}@{_normalize_domain(domain)}"
+    return validate_email(value)[1]
+
+
+def _flag(value, default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE
+
+
+def prepare_record(record: dict | ValueError, verified: bool) -> dict | str:
+    # Returns a users row, or the reason the record was rejected
+    if isinstance(record, ValueError):
+        return str(record)
+    try:
+        email = normalize_email(str(record.get("email") or "").strip())
+    except PydanticCustomError as exc:
+        return f"invalid email: {exc}"
+    phone = str(record.get("phone") or "").strip()
+    phone_e164 = to_e164(phone)
+    if phone_e164 is None:
+        return f"{email}: invalid phone"
+    fname, lname = str(record.get("fname") or "").strip(), str(record.get("lname") or "").strip()
+    if not fname or not lname:
+        return f"{email}: fname and lname are required"
+    password_hash = record.get("password_hash")
+    if password_hash:
+        if pwd_context.identify(password_hash) is None:
+            return f"{email}: unrecognized password_hash"
+        hashed_pw = password_hash
+    elif record.get("password"):
+        hashed_pw = hash_password(str(record["password"]))
+    else:
+        return f"{email}: password or password_hash is required"
+    return {
+        "email": email,
+        "hashed_pw": hashed_pw,
+        "fname": fname,
+        "lname": lname,
+        "phone": phone,
+        "phone_e164": phone_e164,
+        "is_active": _flag(record.get("is_active"), True),
+        "is_verified": _flag(record.get("is_verified"), verified),
+        "is_2fa_enabled": False,
+    }
+
+
+def _prepare_chunk(records: list, verified: bool) -> list[dict | str]:
+    # Runs in a pool process
+    return [prepare_record(record, verified) for record in records]
+
+
+async def _insert_rows(conn, rows: list[dict]) -> list[str]:
+    # Multi-row INSERT ... ON CONFLICT DO NOTHING; returns the inserted emails
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Bulk import does not support {conn.dialect.name}")
+    stmt = insert(User.__table__).on_conflict_do_nothing(index_elements=["email"]).returning(User.__table__.c.email)
+    return (await conn.execute(stmt, rows)).scalars().all()
+
+
+async def _copy_rows(conn, rows: list[dict]) -> list[str]:
+    # COPY into a per-connection temp table (emptied on commit), then move the
+    # rows over in one statement
+    columns = ", ".join(_COLUMNS)
+    await conn.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS users_import ("
+        "email varchar(120), hashed_pw varchar, fname varchar, lname varchar, phone varchar, "
+        "phone_e164 varchar(16), is_active boolean, is_verified boolean, is_2fa_enabled boolean"
+        ") ON COMMIT DELETE ROWS"
+    ))
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        "users_import", records=[tuple(row[column] for column in _COLUMNS) for row in rows], columns=_COLUMNS
+    )
+    result = await conn.execute(text(
+        f"INSERT INTO users ({columns}) SELECT {columns} FROM users_import "
+        "ON CONFLICT (email) DO NOTHING RETURNING email"
+    ))
+    return result.scalars().all()
+
+
+class UserImporter:
+    def __init__(
+        self,
+        sessionmaker=AsyncSessionLocal,
+        batch_size: int = 1000,
+        workers: int | None = None,
+        method: str = "auto",
+        verified: bool = False,
+        on_batch: Callable[[ImportStats], None] | None = None,
+        pool: HashingPool | None = None,
+    ):
+        if method not in ("auto", "copy", "insert"):
+            raise ValueError(f"Unknown import method: {method}")
+        self.sessionmaker = sessionmaker
+        self.batch_size = batch_size
+        # 0 prepares records on a thread in this process (no pool)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        # Shared pool to prepare on instead (the server's hashing_pool)
+        self.pool = pool
+        self.method = method
+        self.verified = verified
+        # Called after every committed batch, e.g. for progress or checkpoints
+        self.on_batch = on_batch
+        self.stats = ImportStats()
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def _prepare(self, records: list) -> list[dict | str]:
+        if self.pool is not None:
+            return await self._prepare_on_pool(records)
+        if not self.workers:
+            # bcrypt releases the GIL; keep it off the event loop either way
+            return await asyncio.to_thread(_prepare_chunk, records, self.verified)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        size = max(1, -(-len(records) // self.workers))
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _prepare_chunk, records[i:i + size], self.verified)
+            for i in range(0, len(records), size)
+        ))
+        return [row for part in parts for row in part]
+
+    async def _prepare_on_pool(self, records: list) -> list[dict | str]:
+        limit = asyncio.Semaphore(max(1, self.pool.workers // 2))
+
+        async def prepare(chunk: list) -> list[dict | str]:
+            async with limit:
+                return await self.pool.run(_prepare_chunk, chunk, self.verified)
+
+        parts = await asyncio.gather(*(
+            prepare(records[i:i + _POOL_CHUNK]) for i in range(0, len(records), _POOL_CHUNK)
+        ))
+        return [row for part in parts for row in part]
+
+    async def _write(self, prepared: list[dict | str]) -> None:
+        rows, seen, rejected = [], set(), 0
+        stats = self.stats
+        for row in prepared:
+            if isinstance(row, str):
+                rejected += 1
+                if len(stats.errors) < _MAX_ERRORS:
+                    stats.errors.append(row)
+            elif row["email"] in seen:
+                continue
+            else:
+                seen.add(row["email"])
+                rows.append(row)
+        inserted = []
+        if rows:
+            async with self.sessionmaker() as session:
+                conn = await session.connection()
+                use_copy = self.method == "copy" or (
+                    self.method == "auto" and conn.dialect.name == "postgresql" and conn.dialect.driver == "asyncpg"
+                )
+                inserted = await (_copy_rows if use_copy else _insert_rows)(conn, rows)
+                await session.commit()
+        # Core inserts bypass the session events that feed the filter; other
+        # workers pick the rows up by updated_at on their next refresh
+        for email in inserted:
+            known_emails.add(email)
+        skipped = len(prepared) - rejected - len(inserted)
+        stats.processed += len(prepared)
+        stats.inserted += len(inserted)
+        stats.skipped += skipped
+        stats.rejected += rejected
+        import_rows.inc(len(inserted), result="inserted")
+        import_rows.inc(skipped, result="skipped")
+        import_rows.inc(rejected, result="rejected")
+        if self.on_batch is not None:
+            self.on_batch(stats)
+
+    async def run(self, records: AsyncIterator[dict | ValueError], skip: int = 0) -> ImportStats:
+        # skip: records already committed by an earlier run (resume)
+        pending: asyncio.Task | None = None
+        batch = []
+        try:
+            async for record in records:
+                if skip:
+                    skip -= 1
+                    continue
+                batch.append(record)
+                if len(batch) < self.batch_size:
+                    continue
+                # Prepare this batch while the previous one is written
+                task = asyncio.create_task(self._prepare(batch))
+                if pending is not None:
+                    await self._write(await pending)
+                pending, batch = task, []
+            if pending is not None:
+                await self._write(await pending)
+                pending = None
+            if batch:
+                await self._write(await self._prepare(batch))
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        return self.stats
@@ -1,16 +1,59 @@
 # app/db/session.py
 
+import asyncio
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
+from app.core.invalidation import bus
+from app.core.metrics import Counter, Gauge, Histogram
+from app.db.instrumentation import InstrumentedQueuePool, instrument_engine
 
-# Create the engine
-engine = create_async_engine(
-    settings.db_url,
-    echo=False,               # Set to True only for debugging SQL queries
-    future=True,
-    pool_pre_ping=True
+logger = logging.getLogger(__name__)
+
+replica_reads = Counter("auth_db_replica_reads_total", "Read-only lookups by target (replica name or primary)")
+replica_healthy = Gauge("auth_db_replica_healthy", "1 if the replica is in rotation, 0 if evicted")
+connection_hold_seconds = Histogram(
+    "auth_db_connection_hold_seconds", "Time a pooled connection was held per transaction, by route"
 )
 
+
+def engine_options(url: str) -> dict:
+    options = {
+        "echo": settings.db_echo,  # Set to True only for debugging SQL queries
+        # Pre-ping costs a round trip per checkout; without it, dead
+        # connections are detected on first use and the pool is invalidated
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite needs its single static connection
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    if parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": settings.db_statement_cache_size}
+    return options
+
+
+# Create the engine
+engine = create_async_engine(settings.db_url, **engine_options(settings.db_url))
+instrument_engine(engine.sync_engine, "primary")
+
 # Create the session factory
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -18,7 +61,194 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+
+@dataclass
+class RequestDBStats:
+    scope: dict | None = None
+    hold_seconds: float = 0.0
+    checkouts: int = 0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route") if self.scope else None
+        return getattr(route, "path", "unmatched")
+
+
+# Set per request by the middleware in app.main; sessions add to it
+request_db_stats: contextvars.ContextVar[RequestDBStats | None] = contextvars.ContextVar(
+    "request_db_stats", default=None
+)
+
+
+@event.listens_for(Session, "after_begin")
+def _connection_acquired(session, transaction, connection):
+    session.info.setdefault("connection_acquired_at", time.perf_counter())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _connection_released(session, transaction):
+    if transaction.parent is not None:
+        return
+    acquired = session.info.pop("connection_acquired_at", None)
+    stats = request_db_stats.get()
+    if acquired is not None and stats is not None:
+        # Observed per transaction: a session closed by dependency teardown
+        # after the response was sent still gets counted
+        held = time.perf_counter() - acquired
+        stats.hold_seconds += held
+        stats.checkouts += 1
+        connection_hold_seconds.observe(held, route=stats.route)
+
+
+class LazySession:
+    # Request-scoped session proxy. The AsyncSession is only created on first
+    # use, so requests that never touch the database cost nothing, and
+    # release() hands the connection back to the pool before slow non-DB work
+    # (password hashing, rendering) instead of holding it until the request ends.
+
+    def __init__(self, factory: async_sessionmaker = None):
+        self._factory = factory or AsyncSessionLocal
+        self._session: AsyncSession | None = None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    async def release(self) -> None:
+        # Ends a read-only transaction. Loaded objects stay usable
+        # (expire_on_commit=False); the next query checks out a new connection.
+        # Sessions with pending changes are left alone.
+        session = self._session
+        if session is None or not session.in_transaction():
+            return
+        if session.new or session.dirty or session.deleted:
+            return
+        await session.commit()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
 # Dependency for FastAPI
 async def get_session() -> AsyncSession:
-    async with AsyncSessionLocal() as session:
+    session = LazySession()
+    try:
         yield session
+    finally:
+        await session.close()
+
+
+class ReplicaSet:
+    # Round-robin over healthy read replicas. Replicas are evicted when a read
+    # fails or a health check finds them down or lagging, and re-admitted by
+    # the health check. Users who changed their own row recently are pinned to
+    # the primary so they read their own writes.
+
+    def __init__(self, urls: list[str]):
+        self.names = [f"replica{i}" for i in range(len(urls))]
+        self.engines = [create_async_engine(url, **engine_options(url)) for url in urls]
+        for name, replica_engine in zip(self.names, self.engines):
+            instrument_engine(replica_engine.sync_engine, name)
+            replica_healthy.set(1, engine=name)
+        self.sessionmakers = [
+            async_sessionmaker(bind=replica_engine, class_=AsyncSession, expire_on_commit=False)
+            for replica_engine in self.engines
+        ]
+        self.healthy = [True] * len(urls)
+        self._cursor = itertools.count()
+        self._sticky_until: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def choose(self, user_id: int | None = None) -> int | None:
+        if not self.engines or (user_id is not None and self.is_sticky(user_id)):
+            return None
+        for _ in range(len(self.engines)):
+            index = next(self._cursor) % len(self.engines)
+            if self.healthy[index]:
+                return index
+        return None
+
+    def mark_written(self, user_id: int) -> None:
+        with self._lock:
+            self._sticky_until[user_id] = time.monotonic() + settings.db_read_your_writes_seconds
+            if len(self._sticky_until) > 10000:
+                now = time.monotonic()
+                self._sticky_until = {k: v for k, v in self._sticky_until.items() if v > now}
+
+    def is_sticky(self, user_id: int) -> bool:
+        deadline = self._sticky_until.get(user_id)
+        return deadline is not None and deadline > time.monotonic()
+
+    def set_health(self, index: int, healthy: bool) -> None:
+        if self.healthy[index] != healthy:
+            logger.warning("Replica %s %s", self.names[index], "back in rotation" if healthy else "evicted")
+        self.healthy[index] = healthy
+        replica_healthy.set(1 if healthy else 0, engine=self.names[index])
+
+    async def _probe(self, index: int) -> bool:
+        replica_engine = self.engines[index]
+        try:
+            async with replica_engine.connect() as conn:
+                if replica_engine.dialect.name == "postgresql":
+                    lag = await conn.scalar(text(
+                        "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+                    ))
+                    return float(lag or 0) <= settings.db_replica_max_lag_seconds
+                await conn.execute(text("SELECT 1"))
+                return True
+        except (DBAPIError, OSError, asyncio.TimeoutError):
+            return False
+
+    async def check_health(self) -> None:
+        for index in range(len(self.engines)):
+            try:
+                healthy = await asyncio.wait_for(self._probe(index), timeout=settings.db_pool_timeout)
+            except asyncio.TimeoutError:
+                healthy = False
+            self.set_health(index, healthy)
+
+    async def run_health_checks(self) -> None:
+        while True:
+            await self.check_health()
+            await asyncio.sleep(settings.db_replica_health_interval_seconds)
+
+    async def dispose(self) -> None:
+        for replica_engine in self.engines:
+            await replica_engine.dispose()
+
+
+replicas = ReplicaSet(settings.db_replica_urls)
+
+
+def _on_user_written(payload: dict) -> None:
+    # Published after every committed change to a user row (app.db.user_cache)
+    if payload.get("id") is not None:
+        replicas.mark_written(payload["id"])
+
+
+bus.subscribe("user", _on_user_written)
+
+
+async def run_on_replica(fn, user_id: int | None = None):
+    # Runs fn(session) on a replica when one is available, falling back to the
+    # primary if none is healthy, the user is pinned, or the replica fails.
+    # The session is closed before returning, so only use it for reads.
+    index = replicas.choose(user_id)
+    if index is not None:
+        try:
+            async with replicas.sessionmakers[index]() as session:
+                result = await fn(session)
+            replica_reads.inc(target=replicas.names[index])
+            return result
+        except (DBAPIError, OSError) as exc:
+            logger.warning("Read on %s failed, using primary: %s", replicas.names[index], exc)
+            replicas.set_health(index, False)
+    async with AsyncSessionLocal() as session:
+        result = await fn(session)
+    replica_reads.inc(target="primary")
+    return result
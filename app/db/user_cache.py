@@ -0,0 +1,143 @@
+# app/db/user_cache.py
+
+# Bounded LRU + TTL cache of user rows, keyed by id and email. Rows are stored
+# as plain column snapshots and re-attached to the caller's session, so cached
+# users behave like freshly loaded ones. Committed changes to User rows are
+# invalidated automatically (see the session events below) and broadcast to
+# the other workers over the invalidation bus.
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.config import settings
+from app.core.invalidation import bus
+from app.core.metrics import Counter, Gauge
+from app.db.models import User
+
+CHANNEL = "user"
+
+cache_hits = Counter("auth_user_cache_hits_total", "User cache hits")
+cache_misses = Counter("auth_user_cache_misses_total", "User cache misses")
+cache_evictions = Counter("auth_user_cache_evictions_total", "User cache evictions")
+cache_size = Gauge("auth_user_cache_size", "Users currently cached")
+
+_mapper = inspect(User)
+_COLUMNS = [attr.key for attr in _mapper.column_attrs]
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._rows: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._ids_by_email: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, user_id: int | None) -> dict | None:
+        entry = self._rows.get(user_id) if user_id is not None else None
+        if entry is None:
+            return None
+        expires, row = entry
+        if expires < time.monotonic():
+            self._drop(user_id)
+            cache_evictions.inc(reason="ttl")
+            return None
+        self._rows.move_to_end(user_id)
+        return row
+
+    def _drop(self, user_id: int) -> None:
+        entry = self._rows.pop(user_id, None)
+        if entry is not None:
+            self._ids_by_email.pop(entry[1]["email"], None)
+        cache_size.set(len(self._rows))
+
+    def get_by_id(self, user_id: int) -> dict | None:
+        with self._lock:
+            row = self._get(user_id)
+        (cache_hits if row is not None else cache_misses).inc(key="id")
+        return row
+
+    def get_by_email(self, email: str) -> dict | None:
+        with self._lock:
+            row = self._get(self._ids_by_email.get(email))
+        (cache_hits if row is not None else cache_misses).inc(key="email")
+        return row
+
+    def put(self, user: User) -> None:
+        row = {key: getattr(user, key) for key in _COLUMNS}
+        with self._lock:
+            self._drop(row["id"])
+            self._rows[row["id"]] = (time.monotonic() + self.ttl, row)
+            self._ids_by_email[row["email"]] = row["id"]
+            while len(self._rows) > self.maxsize:
+                oldest = next(iter(self._rows))
+                self._drop(oldest)
+                cache_evictions.inc(reason="lru")
+            cache_size.set(len(self._rows))
+
+    def invalidate(self, user_id: int | None = None, email: str | None = None) -> None:
+        with self._lock:
+            if email is not None and user_id is None:
+                user_id = self._ids_by_email.get(email)
+            if user_id is not None and user_id in self._rows:
+                self._drop(user_id)
+                cache_evictions.inc(reason="invalidate")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows.clear()
+            self._ids_by_email.clear()
+            cache_size.set(0)
+
+
+user_cache = UserCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds)
+
+
+async def attach(session, row: dict) -> User:
+    # Rebuild a persistent User from a snapshot without issuing a SELECT.
+    # An instance already in the session wins so pending changes are kept.
+    existing = session.identity_map.get(_mapper.identity_key_from_primary_key((row["id"],)))
+    if existing is not None:
+        return existing
+    user = User(**row)
+    make_transient_to_detached(user)
+    return await session.merge(user, load=False)
+
+
+def publish_invalidation(user_id: int | None = None, email: str | None = None) -> None:
+    bus.publish(CHANNEL, {"id": user_id, "email": email})
+
+
+def _on_invalidation(payload: dict) -> None:
+    user_cache.invalidate(payload.get("id"), payload.get("email"))
+    if payload.get("id") is None and payload.get("email") is None:
+        user_cache.clear()
+
+
+bus.subscribe(CHANNEL, _on_invalidation)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    pending = session.info.setdefault("user_cache_invalidate", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            pending.add((obj.id, None))
+            # Drop the old email key too when the email itself changed
+            for old_email in inspect(obj).attrs.email.history.deleted or ():
+                pending.add((None, old_email))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id, email in session.info.pop("user_cache_invalidate", ()):
+        publish_invalidation(user_id, email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidations(session):
+    session.info.pop("user_cache_invalidate", None)
@@ -1,33 +1,184 @@
 # app/main.py
 
-from fastapi import FastAPI
-from app.api import routes_auth, routes_users
-from app.db.models import Base
-from app.db.session import engine
+# App factory. Startup does no schema work (run `python -m app.db.migrate`
+# per deploy); it starts the background tasks and warms the worker in the
+# background, and GET /health/ready turns 200 once that is done and 503 again
+# once SIGTERM arrives (see app.core.warmup).
+#
+#   uvicorn app.main:app
+#   uvicorn --factory app.main:create_app
+
+import asyncio
+import contextlib
+import math
+import secrets
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.api import routes_auth, routes_users, routes_metrics, routes_wellknown, routes_health
+from app.api.responses import ORJSONResponse, ResponseStats, response_stats, response_bytes, response_serialize_seconds
+from app.db.session import replicas, request_db_stats, RequestDBStats, AsyncSessionLocal
+from app.core.hashing import HashingPoolBusy, hashing_pool
+from app.core.config import settings
+from app.core.keys import keyring
+from app.core.ratelimit import RateLimited, login_limiter
+from app.core.totp import totp_verifier
+from app.core.qr import qr_renderer
+from app.core.tracing import run_loop_monitor, tracer
+from app.core.warmup import warmup
+from app.db.known_emails import known_emails, run_known_emails_refresher
+from app.db.maintenance import run_refresh_token_purger
+from app.core.mailer import email_dispatcher
+from app.workers.email import run_worker as run_email_outbox_worker
 from fastapi.middleware.cors import CORSMiddleware
-app = FastAPI(
-    title="Production FastAPI App",
-    description="""
-    **2FA Login Instructions:**  
-    - When using the Swagger UI \"Authorize\" button, enter your 2FA code in the `client_secret` field.\n    - For JSON login, use the `/auth/login-json` endpoint and provide `two_fa_code` in the request body.\n - for using Swagger UI \"Authorize\" button put Client credentials location on Request Body
-   
-    """
-)
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-# Include routers
-app.include_router(routes_auth.router)
-app.include_router(routes_users.router)
-
-# Optional: create tables on startup (for development only)
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+
+DESCRIPTION = """
+**2FA Login Instructions:**
+- When using the Swagger UI "Authorize" button, enter your 2FA code in the `client_secret` field.
+- For JSON login, use the `/auth/login-json` endpoint and provide `two_fa_code` in the request body.
+- For the Swagger UI "Authorize" button, put Client credentials location on Request Body.
+"""
+
+BACKGROUND_TASKS = ("keys_task", "warmup_task", "loop_monitor_task", "purge_task", "outbox_task", "replica_health_task", "known_emails_task")
+
+
+async def track_request_stats(request: Request, call_next):
+    # Per-route connection hold time, response size and serialization time
+    db_stats = RequestDBStats(scope=request.scope)
+    serialization = ResponseStats()
+    db_token = request_db_stats.set(db_stats)
+    response_token = response_stats.set(serialization)
+    try:
+        response = await call_next(request)
+    finally:
+        request_db_stats.reset(db_token)
+        response_stats.reset(response_token)
+    route = db_stats.route
+    length = response.headers.get("content-length")
+    if length is not None:
+        response_bytes.observe(int(length), route=route)
+    if serialization.serialize_seconds:
+        response_serialize_seconds.observe(serialization.serialize_seconds, route=route)
+    if db_stats.checkouts:
+        response.headers["Server-Timing"] = f"db-hold;dur={db_stats.hold_seconds * 1000:.2f}"
+    return response
+
+
+async def trace_requests(request: Request, call_next):
+    # Outermost, so the trace covers the other middleware too
+    requested = request.headers.get("x-trace")
+    admin_token = request.headers.get("x-admin-token")
+    if requested and not (
+        settings.admin_api_token and admin_token
+        and secrets.compare_digest(admin_token, settings.admin_api_token)
+    ):
+        requested = None
+    trace, token = tracer.begin(
+        f"{request.method} {request.url.path}",
+        force=requested is not None,
+        profile=requested == "profile",
+        traceparent=request.headers.get("traceparent"),
+    )
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        trace.name = f"{request.method} {route}"
+        tracer.end(trace, token, **{"http.method": request.method, "http.route": route, "http.status_code": status})
+    if requested is not None:
+        response.headers["X-Trace-Id"] = trace.trace_id
+    return response
+
+
+async def hashing_pool_busy_handler(request: Request, exc: HashingPoolBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many login attempts, please retry later."},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if keyring.enabled:
+        # Parsed before serving; afterwards re-scanned off the event loop
+        await asyncio.to_thread(keyring.reload)
+        app.state.keys_task = asyncio.create_task(keyring.run_reloader())
+    email_dispatcher.start()
+    app.state.warmup_task = asyncio.create_task(warmup.run())
+    restore_sigterm = warmup.install_sigterm_drain(settings.shutdown_drain_seconds)
+    if known_emails.enabled:
+        app.state.known_emails_task = asyncio.create_task(run_known_emails_refresher(AsyncSessionLocal))
+    if settings.email_outbox_enabled and settings.email_outbox_inline_worker:
+        app.state.outbox_task = asyncio.create_task(run_email_outbox_worker())
+    if replicas.engines:
+        app.state.replica_health_task = asyncio.create_task(replicas.run_health_checks())
+    if settings.refresh_token_purge_interval_seconds > 0:
+        app.state.purge_task = asyncio.create_task(run_refresh_token_purger())
+    if settings.loop_monitor_interval_ms > 0:
+        app.state.loop_monitor_task = asyncio.create_task(run_loop_monitor(
+            settings.loop_monitor_interval_ms / 1000, settings.loop_block_threshold_ms / 1000,
+        ))
+    yield
+    restore_sigterm()
+    warmup.drain()
+    for name in BACKGROUND_TASKS:
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    await email_dispatcher.stop()
+    hashing_pool.shutdown()
+    qr_renderer.shutdown()
+    await replicas.dispose()
+    await login_limiter.store.close()
+    await totp_verifier.store.close()
+    await asyncio.to_thread(tracer.close)
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(
+        title="Production FastAPI App",
+        description=DESCRIPTION,
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan,
+    )
+    # Added last is outermost: tracing, request stats, CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(track_request_stats)
+    if settings.tracing_enabled:
+        app.middleware("http")(trace_requests)
+    app.add_exception_handler(HashingPoolBusy, hashing_pool_busy_handler)
+    app.add_exception_handler(RateLimited, rate_limited_handler)
+
+    app.include_router(routes_auth.router)
+    app.include_router(routes_users.router)
+    app.include_router(routes_wellknown.router)
+    app.include_router(routes_health.router)
+    if settings.metrics_enabled:
+        app.include_router(routes_metrics.router)
+    if settings.admin_api_token:
+        # Pulls in the bulk import machinery; only loaded when enabled
+        from app.api import routes_admin
+        app.include_router(routes_admin.router)
+    return app
+
+
+app = create_app()
@@ -0,0 +1,101 @@
+# app/workers/email.py
+
+# Email outbox worker. Claims due messages with SELECT ... FOR UPDATE SKIP
+# LOCKED, sends them over a persistent SMTP connection and marks them sent in
+# the same transaction, so any number of workers can run side by side.
+#
+#   python -m app.workers.email [--batch-size 50] [--poll-interval 1] [--once]
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.mailer import OutgoingEmail, SMTPConnection, emails_failed, emails_retried, emails_sent
+from app.core.tracing import span, tracer
+from app.db.models import EmailOutbox
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def process_batch(connection: SMTPConnection, batch_size: int) -> int:
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            select(EmailOutbox)
+            .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )).scalars().all()
+        if not rows:
+            return 0
+
+        # Traced once there is something to send; empty polls are not
+        async with tracer.background("email.outbox_batch", emails=len(rows)):
+            emails = [OutgoingEmail(to_email=row.to_email, subject=row.subject, body=row.body) for row in rows]
+            with span("smtp.send", emails=len(emails)):
+                results = await asyncio.to_thread(connection.send_batch, emails)
+
+            sent_at = datetime.now(timezone.utc)
+            for row, error in zip(rows, results):
+                if error is None:
+                    row.status = "sent"
+                    row.sent_at = sent_at
+                    row.last_error = None
+                    emails_sent.inc()
+                    continue
+                row.attempts += 1
+                row.last_error = str(error)[:500]
+                if row.attempts > settings.email_max_retries:
+                    row.status = "failed"
+                    emails_failed.inc(reason="retries_exhausted")
+                    logger.error("Giving up on outbox email %s to %s: %s", row.id, row.to_email, error)
+                else:
+                    delay = settings.email_retry_backoff_seconds * 2 ** (row.attempts - 1)
+                    row.next_attempt_at = sent_at + timedelta(seconds=delay)
+                    emails_retried.inc()
+            await session.commit()
+        return len(rows)
+
+
+async def run_worker(batch_size: int = None, poll_interval: float = None, once: bool = False) -> None:
+    batch_size = batch_size or settings.email_batch_size
+    poll_interval = poll_interval or settings.email_outbox_poll_seconds
+    connection = SMTPConnection()
+    try:
+        while True:
+            try:
+                processed = await process_batch(connection, batch_size)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox batch failed")
+                processed = 0
+            if once and processed < batch_size:
+                return
+            if processed < batch_size:
+                await asyncio.sleep(poll_interval)
+    finally:
+        await asyncio.to_thread(connection.close)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deliver queued emails from the email_outbox table")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--poll-interval", type=float, default=None)
+    parser.add_argument("--once", action="store_true", help="exit once the outbox is drained")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    try:
+        asyncio.run(run_worker(args.batch_size, args.poll_interval, args.once))
+    finally:
+        tracer.close()
+
+
+if __name__ == "__main__":
+    main()
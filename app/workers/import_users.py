@@ -0,0 +1,102 @@
+# app/workers/import_users.py
+
+# Bulk user import (see app.db.provisioning for the input format).
+#
+#   python -m app.workers.import_users users.csv [--verified] [--workers 8]
+#   zcat users.jsonl.gz | python -m app.workers.import_users - --format jsonl
+#
+# After every committed batch the number of records consumed so far is written
+# to the state file (default <input>.import-state); a re-run resumes after it.
+# Rows whose email already exists are skipped either way.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from app.core.config import settings
+from app.db.provisioning import FORMATS, ImportStats, UserImporter, iter_records
+
+logger = logging.getLogger(__name__)
+
+
+async def _read_chunks(stream, size: int = 1 << 20):
+    while chunk := await asyncio.to_thread(stream.read, size):
+        yield chunk
+
+
+def _load_state(path: str | None) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f).get("records", 0)
+
+
+def _save_state(path: str, records: int, done: bool = False) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"records": records, "done": done}, f)
+    os.replace(tmp, path)
+
+
+async def run_import(args) -> ImportStats:
+    fmt = args.format or ("csv" if args.input.endswith(".csv") else "jsonl")
+    state_path = args.state or (f"{args.input}.import-state" if args.input != "-" else None)
+    skip = 0 if args.restart else _load_state(state_path)
+    if skip:
+        logger.info("Resuming after %s records (%s)", skip, state_path)
+    last_report = 0.0
+
+    def on_batch(stats: ImportStats) -> None:
+        nonlocal last_report
+        if state_path:
+            _save_state(state_path, skip + stats.processed)
+        if time.monotonic() - last_report >= args.progress_seconds:
+            last_report = time.monotonic()
+            logger.info(
+                "processed=%s inserted=%s skipped=%s rejected=%s rate=%.0f/s",
+                skip + stats.processed, stats.inserted, stats.skipped, stats.rejected, stats.rate,
+            )
+
+    importer = UserImporter(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        method=args.method,
+        verified=args.verified,
+        on_batch=on_batch,
+    )
+    stream = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    try:
+        stats = await importer.run(iter_records(_read_chunks(stream), fmt), skip=skip)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+    if state_path:
+        _save_state(state_path, skip + stats.processed, done=True)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or JSON lines")
+    parser.add_argument("input", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="default: by file extension (.csv, else jsonl)")
+    parser.add_argument("--batch-size", type=int, default=settings.user_import_batch_size)
+    parser.add_argument("--workers", type=int, default=settings.user_import_workers,
+                        help="processes for validation and hashing (0: none; default: CPU count)")
+    parser.add_argument("--method", choices=["auto", "copy", "insert"], default="auto",
+                        help="auto: COPY on PostgreSQL/asyncpg, multi-row INSERT otherwise")
+    parser.add_argument("--verified", action="store_true", help="mark users verified unless the record says otherwise")
+    parser.add_argument("--state", help="checkpoint file (default: <input>.import-state)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first record")
+    parser.add_argument("--progress-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    stats = asyncio.run(run_import(args))
+    print(json.dumps(stats.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
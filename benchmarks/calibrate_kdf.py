@@ -0,0 +1,118 @@
+# benchmarks/calibrate_kdf.py
+
+# Measures password verification cost on this host and recommends KDF
+# parameters for a target latency.
+#
+#   python -m benchmarks.calibrate_kdf --target-ms 50
+#
+# bcrypt: every extra round doubles the cost, so rounds are tried upwards
+# until the p50 passes the target. argon2id (if argon2-cffi is installed):
+# memory is doubled at a fixed time cost. Prints .env lines for the
+# strongest profile that stays under the target, plus the verifies per
+# second one worker core can sustain with it.
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+PASSWORD = "correct horse battery staple"
+
+
+def measure(context: CryptContext, samples: int) -> dict:
+    hashed = context.hash(PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.verify(PASSWORD, hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+    }
+
+
+def calibrate_bcrypt(target_ms: float, samples: int, max_rounds: int) -> tuple[list[dict], dict | None]:
+    results, best = [], None
+    for rounds in range(4, max_rounds + 1):
+        result = {"rounds": rounds, **measure(CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds), samples)}
+        results.append(result)
+        print(f"bcrypt rounds={rounds:<2} p50={result['p50_ms']:>8.2f} ms p95={result['p95_ms']:>8.2f} ms")
+        if result["p50_ms"] > target_ms:
+            break
+        best = result
+    return results, best
+
+
+def calibrate_argon2(target_ms: float, samples: int, time_cost: int, parallelism: int, max_memory_mib: int):
+    from passlib.hash import argon2
+    if not argon2.has_backend():
+        print("argon2: skipped (pip install argon2-cffi)")
+        return [], None
+    results, best = [], None
+    memory_kib = 8 * 1024
+    while memory_kib <= max_memory_mib * 1024:
+        context = CryptContext(
+            schemes=["argon2"],
+            argon2__type="ID",
+            argon2__memory_cost=memory_kib,
+            argon2__rounds=time_cost,
+            argon2__parallelism=parallelism,
+        )
+        result = {"memory_cost": memory_kib, "time_cost": time_cost, "parallelism": parallelism, **measure(context, samples)}
+        results.append(result)
+        print(f"argon2id m={memory_kib // 1024:>5} MiB t={time_cost} p={parallelism} "
+              f"p50={result['p50_ms']:>8.2f} ms p95={result['p95_ms']:>8.2f} ms")
+        if result["p50_ms"] > target_ms:
+            break
+        best = result
+        memory_kib *= 2
+    return results, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recommend password KDF parameters for a target verify latency")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="target p50 per verification")
+    parser.add_argument("--samples", type=int, default=7)
+    parser.add_argument("--max-bcrypt-rounds", type=int, default=16)
+    parser.add_argument("--argon2-time-cost", type=int, default=3)
+    parser.add_argument("--argon2-parallelism", type=int, default=4)
+    parser.add_argument("--max-argon2-memory-mib", type=int, default=1024)
+    parser.add_argument("--json", action="store_true", help="print the full results as JSON")
+    args = parser.parse_args()
+
+    bcrypt_results, bcrypt_best = calibrate_bcrypt(args.target_ms, args.samples, args.max_bcrypt_rounds)
+    argon2_results, argon2_best = calibrate_argon2(
+        args.target_ms, args.samples, args.argon2_time_cost, args.argon2_parallelism, args.max_argon2_memory_mib
+    )
+
+    print(f"\nRecommended for a {args.target_ms:g} ms p50 on this host ({os.cpu_count()} CPUs):")
+    if argon2_best:
+        print('PASSWORD_SCHEMES=["argon2", "bcrypt"]')
+        print(f"ARGON2_MEMORY_COST={argon2_best['memory_cost']}")
+        print(f"ARGON2_TIME_COST={argon2_best['time_cost']}")
+        print(f"ARGON2_PARALLELISM={argon2_best['parallelism']}")
+        print(f"# ~{1000 / argon2_best['p50_ms']:.0f} argon2 verifies/s per worker core")
+    if bcrypt_best:
+        print(f"BCRYPT_ROUNDS={bcrypt_best['rounds']}")
+        print(f"# ~{1000 / bcrypt_best['p50_ms']:.0f} bcrypt verifies/s per worker core")
+        if bcrypt_best["rounds"] < 10:
+            print("# warning: fewer than 10 bcrypt rounds is weak; prefer more hashing workers")
+    if not (bcrypt_best or argon2_best):
+        print("# no profile is fast enough; raise --target-ms")
+
+    if args.json:
+        print(json.dumps({
+            "target_ms": args.target_ms,
+            "bcrypt": bcrypt_results,
+            "argon2": argon2_results,
+            "recommended": {"bcrypt": bcrypt_best, "argon2": argon2_best},
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/import_time.py
+
+# Cold import time of the app, as a worker pays it on boot. Imports the
+# module in fresh interpreters with -X importtime, reports the best run and
+# the slowest top-level packages, and exits with status 1 if the budget is
+# exceeded or a module that should load lazily was imported. Meant for CI:
+#
+#   python -m benchmarks.import_time --budget-ms 1500
+#
+# Settings are read at import time, so the environment must carry them
+# (JWT_SECRET, EMAIL_*, ...).
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Only needed on rarely used paths: 2FA setup QR codes (app.core.qr) and the
+# admin routes (app.main)
+# Not listed, deliberately: phonenumbers (app.core.phone). The request schemas
+# use pydantic_extra_types' PhoneNumber, which imports it when app.main loads.
+# Add "phonenumbers" here once the schemas stop using that type.
+LAZY_MODULES = ["qrcode", "PIL", "app.db.provisioning"]
+
+
+def measure(module: str) -> tuple[float, dict[str, float], set[str]]:
+    # Returns (total seconds, self time per top-level package, imported modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    total = 0.0
+    packages: dict[str, float] = defaultdict(float)
+    modules: set[str] = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules.add(name)
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == module:
+            total = int(cumulative_us) / 1e6
+    return total, packages, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time budget for the app")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5, help="best of N fresh interpreters")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail above this (best run)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    total, packages, modules = min(runs, key=lambda run: run[0])
+    eager = [name for name in LAZY_MODULES if name in modules]
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]
+    results = {
+        "module": args.module,
+        "import_ms": round(total * 1000, 1),
+        "runs_ms": [round(run[0] * 1000, 1) for run in runs],
+        "budget_ms": args.budget_ms,
+        "top_packages_ms": {name: round(seconds * 1000, 1) for name, seconds in top},
+        "eager_lazy_modules": eager,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"import {args.module}: {results['import_ms']} ms (best of {args.runs})")
+        for name, ms in results["top_packages_ms"].items():
+            print(f"  {name:<24} {ms:>8.1f} ms")
+        for name in eager:
+            print(f"  imported eagerly: {name}")
+
+    over = args.budget_ms is not None and total * 1000 > args.budget_ms
+    if over:
+        print(f"over budget: {results['import_ms']} ms > {args.budget_ms} ms", file=sys.stderr)
+    if over or eager:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# benchmarks/load.py
+
+# Load test for the auth endpoints. Boots app.main.app in-process (lifespan
+# included) behind httpx's ASGI transport, with a fresh SQLite database (or
+# --db-url) and benchmarks.smtp_sink as the mail server, then drives a
+# weighted mix of operations from --concurrency workers.
+#
+#   python -m benchmarks.load --mix mixed --concurrency 32 --duration 30 --output run.json
+#   python -m benchmarks.load --mix mixed --baseline run.json   # exits 1 on regressions
+#
+# Reported per operation and overall: p50/p95/p99 latency, requests per
+# second, errors and SQL statements per request; plus event-loop lag sampled
+# every 10 ms. Operations are chosen from a seeded RNG, so a run is
+# repeatable for a given --seed. Settings come from the environment as
+# usual; the ones needed to boot default to local stand-ins. Lower
+# BCRYPT_ROUNDS to load-test everything except the KDF.
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict, deque
+
+MIXES = {
+    "mixed": {"login": 15, "login_2fa": 5, "refresh": 15, "me": 60, "register": 5},
+    "login": {"login": 80, "login_2fa": 20},
+    "me": {"me": 100},
+    "refresh": {"refresh": 100},
+    "register": {"register": 100},
+}
+PASSWORD = "bench-password"
+_DEFAULTS = {
+    "JWT_SECRET": "bench-secret",
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_DB": "bench",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_PORT": "5432",
+    "EMAIL_USER": "bench",
+    "EMAIL_PASSWORD": "bench",
+    "EMAIL_FROM": "bench@example.com",
+    "EMAIL_FROM_NAME": "Bench",
+    "FRONTEND_URL": "http://localhost",
+    "APP_NAME": "Bench",
+    "RATE_LIMIT_ENABLED": "false",
+}
+
+# Operation the current worker is running; SQL statements are attributed to it
+current_op: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_op", default=None)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int, statements: int) -> dict:
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "requests": count,
+        "errors": errors,
+        "rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "queries_per_request": round(statements / count, 2) if count else 0.0,
+    }
+
+
+class Account:
+    def __init__(self, email: str, totp_secret: str | None = None):
+        self.email = email
+        self.totp_secret = totp_secret
+        self.access_token: str | None = None
+        self.refresh_token: str | None = None
+        self.last_totp_step = -1
+
+
+class LoadRun:
+    def __init__(self, client, args):
+        import pyotp
+
+        self.pyotp = pyotp
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statements: dict[str, int] = defaultdict(int)
+        self.skipped: dict[str, int] = defaultdict(int)
+        # Accounts are checked out by one worker at a time, so refresh
+        # rotation never races itself (which would trip reuse detection)
+        self.accounts: deque[Account] = deque()
+        self.accounts_2fa: deque[Account] = deque()
+        self.registered = 0
+        self.recording = False
+
+    # setup
+
+    async def _create_account(self, email: str, with_2fa: bool) -> Account:
+        from app.core.security import generate_email_verification_token
+
+        response = await self.client.post("/auth/register", json={
+            "email": email, "password": PASSWORD, "fname": "Bench", "lname": "User", "phone": "+989171064369",
+        })
+        response.raise_for_status()
+        await self.client.get("/auth/verify-email", params={"token": generate_email_verification_token(email)})
+        account = Account(email)
+        tokens = response.json()
+        account.access_token, account.refresh_token = tokens["access_token"], tokens["refresh_token"]
+        if with_2fa:
+            headers = {"Authorization": f"Bearer {account.access_token}"}
+            secret = (await self.client.post("/users/2fa/setup?format=none", headers=headers)).json()["secret"]
+            response = await self.client.post("/users/2fa/enable", headers=headers, json={"code": self.pyotp.TOTP(secret).now()})
+            response.raise_for_status()
+            account.totp_secret = secret
+            account.last_totp_step = int(time.time() // 30)
+        return account
+
+    async def setup(self) -> None:
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def create(i: int, with_2fa: bool) -> None:
+            async with semaphore:
+                account = await self._create_account(f"bench{i}{'-2fa' if with_2fa else ''}@example.com", with_2fa)
+            (self.accounts_2fa if with_2fa else self.accounts).append(account)
+
+        await asyncio.gather(
+            *(create(i, False) for i in range(self.args.users)),
+            *(create(i, True) for i in range(self.args.users_2fa)),
+        )
+
+    # operations; each returns True on the expected response, None when it
+    # had to be skipped (no account available)
+
+    def _take(self, pool: deque) -> Account | None:
+        return pool.popleft() if pool else None
+
+    async def op_login(self) -> bool | None:
+        account = self._take(self.accounts)
+        if account is None:
+            return None
+        try:
+            response = await self.client.post("/auth/login-json", json={"username": account.email, "password": PASSWORD})
+            if response.status_code != 200:
+                return False
+            tokens = response.json()
+            account.access_token, account.refresh_token = tokens["access_token"], tokens["refresh_token"]
+            return True
+        finally:
+            self.accounts.append(account)
+
+    async def op_login_2fa(self) -> bool | None:
+        # A code is accepted once per user and 30 s step (replay protection),
+        # so only accounts that haven't logged in during this step are used
+        step = int(time.time() // 30)
+        for _ in range(len(self.accounts_2fa)):
+            account = self.accounts_2fa.popleft()
+            if account.last_totp_step < step:
+                break
+            self.accounts_2fa.append(account)
+        else:
+            return None
+        try:
+            account.last_totp_step = step
+            response = await self.client.post("/auth/login-json", json={
+                "username": account.email, "password": PASSWORD, "two_fa_code": self.pyotp.TOTP(account.totp_secret).now(),
+            })
+            return response.status_code == 200
+        finally:
+            self.accounts_2fa.append(account)
+
+    async def op_refresh(self) -> bool | None:
+        account = self._take(self.accounts)
+        if account is None:
+            return None
+        try:
+            response = await self.client.post("/auth/refresh", json={"refresh_token": account.refresh_token})
+            if response.status_code != 200:
+                return False
+            tokens = response.json()
+            account.access_token, account.refresh_token = tokens["access_token"], tokens["refresh_token"]
+            return True
+        finally:
+            self.accounts.append(account)
+
+    async def op_me(self) -> bool | None:
+        if not self.accounts:
+            return None
+        # Read-only, so accounts are shared between workers
+        account = self.accounts[self.rng.randrange(len(self.accounts))]
+        response = await self.client.get("/users/me", headers={"Authorization": f"Bearer {account.access_token}"})
+        return response.status_code == 200
+
+    async def op_register(self) -> bool | None:
+        self.registered += 1
+        response = await self.client.post("/auth/register", json={
+            "email": f"burst{self.registered}-{self.args.seed}@example.com", "password": PASSWORD,
+            "fname": "Burst", "lname": "User", "phone": "+989171064369",
+        })
+        return response.status_code == 201
+
+    # driver
+
+    async def worker(self, names: list[str], weights: list[int], deadline: float, budget: list[int]) -> None:
+        while time.perf_counter() < deadline and budget[0] != 0:
+            budget[0] -= 1
+            name = self.rng.choices(names, weights)[0]
+            token = current_op.set(name)
+            started = time.perf_counter()
+            try:
+                ok = await getattr(self, f"op_{name}")()
+            except Exception:
+                ok = False
+            finally:
+                current_op.reset(token)
+            elapsed = time.perf_counter() - started
+            if not self.recording:
+                continue
+            if ok is None:
+                self.skipped[name] += 1
+                await asyncio.sleep(0.001)
+            elif ok:
+                self.latencies[name].append(elapsed)
+            else:
+                self.errors[name] += 1
+
+    async def drive(self, mix: dict[str, int], duration: float, requests: int | None, record: bool) -> float:
+        self.recording = record
+        names, weights = list(mix), list(mix.values())
+        budget = [requests if requests else -1]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.worker(names, weights, started + duration, budget) for _ in range(self.args.concurrency)
+        ))
+        return time.perf_counter() - started
+
+
+async def measure_loop_lag(samples: list[float], interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    # Latency may grow and throughput shrink by at most `tolerance` (a fraction)
+    regressions = []
+    for name, current in result["operations"].items():
+        before = baseline.get("operations", {}).get(name)
+        if not before or not current["requests"]:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if before[key] and current[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {before[key]} -> {current[key]}")
+        if before["rps"] and current["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name} rps: {before['rps']} -> {current['rps']}")
+    return regressions
+
+
+async def run(args) -> dict:
+    from benchmarks.smtp_sink import SMTPSink
+
+    sink = SMTPSink(port=0, keep=False)
+    await sink.start()
+    # Settings are read when the app is imported
+    os.environ["DB_URL"] = args.db_url
+    os.environ.update(EMAIL_HOST=sink.host, EMAIL_PORT=str(sink.port), EMAIL_USE_TLS="false")
+    for key, value in _DEFAULTS.items():
+        os.environ.setdefault(key, value)
+
+    import httpx
+    from sqlalchemy import event
+
+    from app.core.config import settings
+    from app.db.models import Base
+    from app.db.session import engine
+    from app.main import app
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements: dict[str, int] = defaultdict(int)
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        name = current_op.get()
+        if name is not None:
+            statements[name] += 1
+
+    mix = MIXES[args.mix]
+    lag: list[float] = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            load = LoadRun(client, args)
+            await load.setup()
+            if args.warmup:
+                # 2FA accounts are left fresh for the measured run
+                warmup_mix = {name: weight for name, weight in mix.items() if name != "login_2fa"}
+                await load.drive(warmup_mix or mix, args.warmup, None, record=False)
+            if "login_2fa" in mix and load.accounts_2fa:
+                # Enabling 2FA used up the current TOTP step of every account
+                await asyncio.sleep(30 - time.time() % 30 + 0.1)
+            statements.clear()
+            lag_task = asyncio.create_task(measure_loop_lag(lag))
+            elapsed = await load.drive(mix, args.duration, args.requests, record=True)
+            lag_task.cancel()
+    await sink.stop()
+
+    operations = {
+        name: {
+            **summarize(load.latencies[name], elapsed, load.errors[name], statements[name]),
+            "skipped": load.skipped[name],
+        }
+        for name in mix
+    }
+    total = summarize(
+        [value for values in load.latencies.values() for value in values],
+        elapsed,
+        sum(load.errors.values()),
+        sum(statements.values()),
+    )
+    lag_sorted = sorted(lag)
+    return {
+        "config": {
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "users": args.users,
+            "users_2fa": args.users_2fa,
+            "seed": args.seed,
+            "db": engine.dialect.name,
+            "password_schemes": settings.password_schemes,
+            "bcrypt_rounds": settings.bcrypt_rounds,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "elapsed_s": round(elapsed, 3),
+        "total": total,
+        "operations": operations,
+        "event_loop_lag_ms": {
+            "p50": round(percentile(lag_sorted, 0.50) * 1000, 2),
+            "p99": round(percentile(lag_sorted, 0.99) * 1000, 2),
+            "max": round(max(lag_sorted, default=0.0) * 1000, 2),
+            "mean": round(statistics.fmean(lag_sorted) * 1000, 2) if lag_sorted else 0.0,
+        },
+        "emails_received": sink.received,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the auth endpoints in-process")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to measure")
+    parser.add_argument("--requests", type=int, help="stop after this many operations instead")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unrecorded load first")
+    parser.add_argument("--users", type=int, default=50, help="accounts without 2FA")
+    parser.add_argument("--users-2fa", type=int, default=20,
+                        help="accounts with 2FA; each can log in once per 30 s TOTP step (the rest are reported as skipped)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db-url", default="sqlite+aiosqlite:///bench_load.db",
+                        help="recreated from the models; point it at a scratch database only")
+    parser.add_argument("--output", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--baseline", help="compare against a saved result")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression vs the baseline (fraction)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        result["regressions"] = compare(result, baseline, args.tolerance)
+        differing = [
+            key for key in ("mix", "concurrency", "db", "password_schemes", "bcrypt_rounds", "cpus")
+            if baseline.get("config", {}).get(key) != result["config"][key]
+        ]
+        if differing:
+            print(f"Warning: baseline was recorded with different {', '.join(differing)}", file=sys.stderr)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if result.get("regressions"):
+        print("Regressions against the baseline:\n  " + "\n  ".join(result["regressions"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/qr_render.py
+
+# Render time and payload size of the 2FA setup QR code: the original
+# qrcode.make() PNG as a base64 data URI against the compact PNG and SVG
+# served by GET /users/2fa/qr.
+#
+#   python -m benchmarks.qr_render --iterations 200
+
+import argparse
+import base64
+import io
+import json
+import statistics
+import time
+
+import pyotp
+import qrcode
+
+from app.core.qr import render_qr
+
+
+def legacy(uri: str) -> bytes:
+    buf = io.BytesIO()
+    qrcode.make(uri).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def measure(fn, uri: str, iterations: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        image = fn(uri)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "bytes": len(image),
+        "data_uri_bytes": len(base64.b64encode(image)) + len("data:image/png;base64,"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="2FA QR code render time and size")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    uri = pyotp.TOTP(pyotp.random_base32()).provisioning_uri(name="someone@example.com", issuer_name="MAGIC")
+    results = {
+        "legacy_png": measure(legacy, uri, args.iterations),
+        "png": measure(lambda data: render_qr(data, "png"), uri, args.iterations),
+        "svg": measure(lambda data: render_qr(data, "svg"), uri, args.iterations),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
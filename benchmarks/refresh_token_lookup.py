@@ -0,0 +1,126 @@
+# benchmarks/refresh_token_lookup.py
+
+# Refresh-token lookup latency against a large refresh_tokens table.
+#
+#   python -m benchmarks.refresh_token_lookup --db-url postgresql+asyncpg://... --rows 10000000
+#
+# Rows go into a scratch table, bench_refresh_tokens, with the same columns
+# and indexes as refresh_tokens; the app's own tables are never touched. They
+# are bulk inserted once (pass --reuse to keep an existing scratch table),
+# then random active and revoked tokens are presented the way
+# rotate_refresh_token handles them: the conditional UPDATE ... RETURNING
+# and, when it matches nothing, the reuse check. Each lookup runs in a
+# transaction that is rolled back, so the table stays as populated.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, func, insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+scratch = MetaData()
+# Mirrors app.db.models.RefreshToken, minus the foreign key to users
+tokens = Table(
+    "bench_refresh_tokens",
+    scratch,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, nullable=False, index=True),
+    Column("token_hash", String(64), unique=True, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("expires_at", DateTime(timezone=True), nullable=False, index=True),
+    Column("revoked", Boolean, default=False),
+    Column("revoked_at", DateTime(timezone=True), nullable=True, index=True),
+    Column("revoked_reason", String(16), nullable=True),
+)
+
+
+def _token(i: int) -> str:
+    return f"bench-token-{i}"
+
+
+def _digest(i: int) -> str:
+    return hashlib.sha256(_token(i).encode()).hexdigest()
+
+
+async def populate(conn, rows: int, batch: int, revoked_ratio: float) -> None:
+    now = datetime.now(timezone.utc)
+    expires = now + timedelta(days=30)
+    for start in range(0, rows, batch):
+        chunk = []
+        for i in range(start, min(start + batch, rows)):
+            revoked = random.random() < revoked_ratio
+            chunk.append({
+                "user_id": 1,
+                "token_hash": _digest(i),
+                "expires_at": expires,
+                "revoked": revoked,
+                "revoked_at": now if revoked else None,
+                "revoked_reason": "rotated" if revoked else None,
+            })
+        await conn.execute(insert(tokens), chunk)
+        print(f"\rinserted {min(start + batch, rows):,}/{rows:,}", end="", flush=True)
+    print()
+
+
+async def run(args) -> dict:
+    engine = create_async_engine(args.db_url)
+    async with engine.begin() as conn:
+        if not args.reuse:
+            await conn.run_sync(scratch.drop_all)
+            await conn.run_sync(scratch.create_all)
+            await populate(conn, args.rows, args.batch, args.revoked_ratio)
+        rows = await conn.scalar(select(func.count(tokens.c.id)))
+
+    now = datetime.now(timezone.utc)
+    timings = []
+    async with engine.connect() as conn:
+        for _ in range(args.lookups):
+            digest = hashlib.sha256(_token(random.randrange(rows)).encode()).hexdigest()
+            rotate = (
+                update(tokens)
+                .where(tokens.c.token_hash == digest, tokens.c.revoked == False, tokens.c.expires_at > now)
+                .values(revoked=True, revoked_at=now, revoked_reason="rotated")
+                .returning(tokens.c.user_id)
+            )
+            reused = select(tokens.c.user_id).where(
+                tokens.c.token_hash == digest, tokens.c.revoked_reason == "rotated",
+            )
+            transaction = await conn.begin()
+            started = time.perf_counter()
+            if (await conn.execute(rotate)).scalar_one_or_none() is None:
+                await conn.scalar(reused)
+            timings.append((time.perf_counter() - started) * 1000)
+            await transaction.rollback()
+    await engine.dispose()
+
+    timings.sort()
+    return {
+        "rows": rows,
+        "lookups": len(timings),
+        "p50_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 4),
+        "p99_ms": round(timings[int(len(timings) * 0.99) - 1], 4),
+        "max_ms": round(timings[-1], 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Refresh-token rotation lookup latency benchmark")
+    parser.add_argument("--db-url", default="sqlite+aiosqlite:///./bench_refresh_tokens.db")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    parser.add_argument("--revoked-ratio", type=float, default=0.9)
+    parser.add_argument("--reuse", action="store_true", help="keep an already populated bench_refresh_tokens table")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
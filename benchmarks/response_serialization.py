@@ -0,0 +1,88 @@
+# benchmarks/response_serialization.py
+
+# Per-response serialization cost for Token and UserOut bodies.
+#
+#   default - what FastAPI does for a handler returning a dict with
+#             response_model: validate into the model, jsonable_encoder,
+#             then stdlib json in JSONResponse
+#   model   - model_response(): dump an already validated model with
+#             pydantic-core (app.api.responses)
+#   orjson  - ORJSONResponse / user_out_body(): orjson over a plain dict
+#
+#   python -m benchmarks.response_serialization --iterations 20000
+
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.api.responses import ORJSONResponse, model_response
+from app.api.schemas import Token, UserOut
+
+
+def ops_per_second(fn, iterations: int) -> int:
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round(iterations / (time.perf_counter() - started))
+
+
+def compare(name: str, model_cls, content: dict, iterations: int) -> dict:
+    adapter = TypeAdapter(model_cls)
+    validated = model_cls(**content)
+
+    def default():
+        return JSONResponse(jsonable_encoder(adapter.validate_python(content))).body
+
+    def model():
+        return model_response(validated).body
+
+    def orjson_dict():
+        return ORJSONResponse(content).body
+
+    result = {
+        "bytes": len(default()),
+        "default_ops": ops_per_second(default, iterations),
+        "model_ops": ops_per_second(model, iterations),
+        "orjson_ops": ops_per_second(orjson_dict, iterations),
+    }
+    result["speedup_model"] = round(result["model_ops"] / result["default_ops"], 1)
+    result["speedup_orjson"] = round(result["orjson_ops"] / result["default_ops"], 1)
+    print(f"{name:8} " + " ".join(f"{key}={value}" for key, value in result.items()))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Response serialization throughput")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    token = {
+        "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + "x" * 180 + ".signature-signature-signature",
+        "refresh_token": "r" * 86,
+        "token_type": "bearer",
+    }
+    user = {
+        "id": 42,
+        "email": "someone@example.com",
+        "fname": "Some",
+        "lname": "One",
+        "phone": "+989171064369",
+        "is_active": True,
+        "is_2fa_enabled": False,
+    }
+    results = {
+        "Token": compare("Token", Token, token, args.iterations),
+        "UserOut": compare("UserOut", UserOut, user, args.iterations),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/smtp_sink.py
+
+# Minimal asyncio SMTP server that accepts and discards (or records) mail.
+# Stand-in for a real mail server in local runs and benchmarks:
+#
+#   python -m benchmarks.smtp_sink --port 8025
+#
+# then run the app with EMAIL_HOST=localhost EMAIL_PORT=8025 EMAIL_USE_TLS=false.
+# AUTH is accepted without checking credentials; STARTTLS is not supported.
+
+import argparse
+import asyncio
+
+
+class SMTPSink:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025, keep: bool = True):
+        self.host = host
+        self.port = port
+        self.keep = keep
+        self.messages: list[dict] = []
+        self.received = 0
+        self.connections = 0
+        self._server: asyncio.base_events.Server | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        reply = lambda line: writer.write(line.encode() + b"\r\n")
+        reply("220 smtp-sink ready")
+        sender, recipients = None, []
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip()
+                verb = command[:4].upper()
+                if verb in ("HELO", "EHLO"):
+                    reply("250-smtp-sink")
+                    reply("250 AUTH PLAIN LOGIN")
+                elif verb == "AUTH":
+                    reply("235 Authentication successful")
+                elif verb == "MAIL":
+                    sender, recipients = command[10:].strip("<> "), []
+                    reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command[8:].strip("<> "))
+                    reply("250 OK")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while (data := await reader.readline()) not in (b".\r\n", b""):
+                        lines.append(data)
+                    self.received += 1
+                    if self.keep:
+                        self.messages.append({"from": sender, "to": recipients, "data": b"".join(lines).decode()})
+                    reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 Command not implemented")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def _serve(host: str, port: int) -> None:
+    sink = SMTPSink(host, port, keep=False)
+    await sink.start()
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    while True:
+        await asyncio.sleep(10)
+        print(f"received={sink.received} connections={sink.connections}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/write_path.py
+
+# SQL round trips and commits per auth endpoint. Drives the app in-process
+# (no lifespan, so no background workers touch the database) and counts the
+# statements and COMMITs issued while each request runs. Commits of
+# transactions that only read (LazySession.release() before hashing) are
+# counted separately as releases.
+#
+#   python -m benchmarks.write_path --db-url sqlite+aiosqlite:///bench.db --users 50
+#
+# The database is recreated from the models. The other settings are read from
+# the environment as usual (JWT_SECRET, EMAIL_*, ...).
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Round trips and commits per auth endpoint")
+    parser.add_argument("--db-url", default=os.environ.get("DB_URL", "sqlite+aiosqlite:///write_path_bench.db"))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    # Settings are read at import time
+    os.environ["DB_URL"] = args.db_url
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    import asyncio
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from app.core.security import generate_email_verification_token
+    from app.db.models import Base
+    from app.db.session import engine, request_db_stats
+    from app.main import app
+
+    async def reset_schema() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(reset_schema())
+    asyncio.run(engine.dispose())
+
+    counts = {"statements": 0, "commits": 0, "releases": 0}
+
+    # Only count work done on behalf of a request
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        if request_db_stats.get() is not None:
+            counts["statements"] += 1
+            if not statement.lstrip().upper().startswith("SELECT"):
+                conn.info["wrote"] = True
+
+    @event.listens_for(engine.sync_engine, "commit")
+    def _count_commit(conn):
+        if request_db_stats.get() is not None:
+            counts["commits" if conn.info.pop("wrote", False) else "releases"] += 1
+
+    samples: dict[str, dict[str, list]] = defaultdict(lambda: defaultdict(list))
+    client = TestClient(app)
+
+    def call(name: str, method: str, url: str, expect: int, **kwargs):
+        counts.update(statements=0, commits=0, releases=0)
+        started = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code != expect:
+            sys.exit(f"{name}: expected {expect}, got {response.status_code}: {response.text[:200]}")
+        samples[name]["statements"].append(counts["statements"])
+        samples[name]["commits"].append(counts["commits"])
+        samples[name]["releases"].append(counts["releases"])
+        samples[name]["ms"].append(elapsed * 1000)
+        return response
+
+    for i in range(args.users):
+        email = f"bench{i}@example.com"
+        credentials = {"username": email, "password": "bench-password"}
+        call("register", "POST", "/auth/register", 201, json={
+            "email": email, "password": "bench-password", "fname": "B", "lname": "B", "phone": "+989171064369",
+        })
+        call("login_unverified", "POST", "/auth/login", 403, data=credentials)
+        call("verify_email", "GET", "/auth/verify-email", 200, params={"token": generate_email_verification_token(email)})
+        call("login", "POST", "/auth/login", 200, data=credentials)
+        tokens = call("login_json", "POST", "/auth/login-json", 200, json=credentials).json()
+        tokens = call("refresh", "POST", "/auth/refresh", 200, json={"refresh_token": tokens["refresh_token"]}).json()
+        call("logout", "POST", "/users/logout", 204, json={"refresh_token": tokens["refresh_token"]},
+             headers={"Authorization": f"Bearer {tokens['access_token']}"})
+
+    results = {
+        name: {
+            "statements": round(statistics.mean(values["statements"]), 2),
+            "commits": round(statistics.mean(values["commits"]), 2),
+            "releases": round(statistics.mean(values["releases"]), 2),
+            "p50_ms": round(statistics.median(values["ms"]), 2),
+        }
+        for name, values in samples.items()
+    }
+    for name, result in results.items():
+        print(f"{name:17} " + " ".join(f"{key}={value}" for key, value in result.items()))
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
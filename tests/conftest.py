@@ -0,0 +1,115 @@
+# tests/conftest.py
+
+# Runs the app in-process against a scratch SQLite file. Settings are read at
+# import time, so the environment is set up before anything from app is
+# imported; tables are created once and emptied after every test, together
+# with the per-worker state (rate-limit buckets, revocations, TOTP steps).
+
+import os
+import shutil
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="auth-tests-")
+DB_PATH = os.path.join(_scratch, "test.db")
+
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+for name, value in {
+    "JWT_SECRET": "test-secret",
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_DB": "test",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_PORT": "5432",
+    "EMAIL_HOST": "localhost",
+    "EMAIL_PORT": "25",
+    "EMAIL_USER": "test",
+    "EMAIL_PASSWORD": "test",
+    "EMAIL_FROM": "noreply@example.com",
+    "EMAIL_FROM_NAME": "Test",
+    "FRONTEND_URL": "http://frontend.test",
+    "APP_NAME": "Test",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ.update({
+    "BCRYPT_ROUNDS": "4",
+    # Messages stay in the outbox; nothing talks to SMTP
+    "EMAIL_OUTBOX_ENABLED": "true",
+    "EMAIL_OUTBOX_INLINE_WORKER": "false",
+    "INVALIDATION_BACKEND": "memory",
+    "TRACING_ENABLED": "false",
+})
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine
+
+from app.core.ratelimit import MemoryStore, login_limiter
+from app.core.revocation import revocations
+from app.core.totp import MemoryStepStore, totp_verifier
+from app.db.crud_user import create_user
+from app.db.models import Base
+from app.db.session import AsyncSessionLocal, engine
+from app.main import create_app
+
+PASSWORD = "Passw0rd!test"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    sync_engine = create_engine(f"sqlite:///{DB_PATH}")
+    Base.metadata.create_all(sync_engine)
+    yield sync_engine
+    sync_engine.dispose()
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+async def clean_state(schema):
+    login_limiter.store = MemoryStore()
+    totp_verifier.store = MemoryStepStore()
+    revocations.clear()
+    yield
+    # Pooled aiosqlite connections belong to this test's event loop
+    await engine.dispose()
+    with schema.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture(scope="session")
+def app():
+    return create_app()
+
+
+@pytest.fixture
+async def client(app):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def make_user():
+    async def make(email: str = "user@example.com", verified: bool = True):
+        async with AsyncSessionLocal() as session:
+            user = await create_user(
+                session, email, PASSWORD, "Test", "User", "+12025550123", is_verified=verified,
+            )
+            await session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def login(client):
+    async def do_login(email: str = "user@example.com", password: str = PASSWORD) -> dict:
+        response = await client.post("/auth/login-json", json={"username": email, "password": password})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return do_login
@@ -0,0 +1,36 @@
+# tests/test_hashing.py
+
+import asyncio
+import threading
+
+import pytest
+
+from app.core.hashing import HashingPool, HashingPoolBusy, hashing_pool
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_pool_rejects_work_beyond_its_queue():
+    pool = HashingPool(kind="thread", workers=1, max_queue=0)
+    release = threading.Event()
+    running = asyncio.create_task(pool.run(release.wait))
+    try:
+        while pool.pending == 0:
+            await asyncio.sleep(0)
+        with pytest.raises(HashingPoolBusy):
+            await pool.run(sum, [1, 2])
+    finally:
+        release.set()
+        await running
+        pool.shutdown()
+    assert pool.pending == 0
+    assert await pool.run(sum, [1, 2]) == 3
+    pool.shutdown()
+
+
+async def test_busy_pool_answers_503(client, make_user, monkeypatch):
+    await make_user()
+    monkeypatch.setattr(hashing_pool, "_pending", hashing_pool.workers + hashing_pool.max_queue)
+    response = await client.post("/auth/login-json", json={"username": "user@example.com", "password": "whatever"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,74 @@
+# tests/test_provisioning.py
+
+import argparse
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.core.hashing import HashingPool
+from app.db.models import User
+from app.db.provisioning import UserImporter, iter_records
+from app.db.session import AsyncSessionLocal
+from app.workers.import_users import run_import
+
+pytestmark = pytest.mark.anyio
+
+
+def record(i: int, **fields) -> dict:
+    return {"email": f"user{i}@example.com", "fname": "Imported", "lname": "User",
+            "phone": "+12025550123", "password": "imported-pw", **fields}
+
+
+def jsonl(records: list[dict]) -> bytes:
+    return "\n".join(json.dumps(item) for item in records).encode()
+
+
+async def chunks(data: bytes, size: int = 64):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def emails() -> set[str]:
+    async with AsyncSessionLocal() as session:
+        return set((await session.scalars(select(User.email))).all())
+
+
+async def test_import_skips_existing_and_rejects_invalid():
+    data = jsonl([record(1), record(2), record(3, email="not-an-email"), record(1)])
+
+    stats = await UserImporter(batch_size=2, workers=0).run(iter_records(chunks(data), "jsonl"))
+    assert (stats.inserted, stats.skipped, stats.rejected) == (2, 1, 1)
+    assert await emails() == {"user1@example.com", "user2@example.com"}
+
+    # Re-running the same file inserts nothing
+    stats = await UserImporter(batch_size=2, workers=0).run(iter_records(chunks(data), "jsonl"))
+    assert (stats.inserted, stats.skipped, stats.rejected) == (0, 3, 1)
+
+
+async def test_cli_resumes_after_the_checkpoint(tmp_path):
+    source = tmp_path / "users.jsonl"
+    source.write_bytes(jsonl([record(i) for i in range(5)]))
+    state = tmp_path / "users.jsonl.import-state"
+    # An earlier run committed the first three records
+    state.write_text(json.dumps({"records": 3}))
+    args = argparse.Namespace(
+        input=str(source), format=None, state=None, restart=False, batch_size=2, workers=0,
+        method="auto", verified=True, progress_seconds=60.0,
+    )
+
+    stats = await run_import(args)
+    assert stats.processed == 2
+    assert await emails() == {"user3@example.com", "user4@example.com"}
+    assert json.loads(state.read_text()) == {"records": 5, "done": True}
+
+
+async def test_import_on_a_shared_pool():
+    # The API path: records are prepared on the server's hashing pool
+    pool = HashingPool(kind="thread", workers=2, max_queue=4)
+    try:
+        data = jsonl([record(i) for i in range(20)])
+        stats = await UserImporter(batch_size=10, pool=pool).run(iter_records(chunks(data), "jsonl"))
+    finally:
+        pool.shutdown()
+    assert stats.inserted == 20
@@ -0,0 +1,51 @@
+# tests/test_ratelimit.py
+
+import pytest
+
+from app.core.ratelimit import Rule, login_limiter
+
+pytestmark = pytest.mark.anyio
+
+
+async def attempt(client, password: str = "wrong-password", email: str = "user@example.com"):
+    return await client.post("/auth/login-json", json={"username": email, "password": password})
+
+
+async def test_ip_bucket_answers_429_with_retry_after(client, make_user, monkeypatch):
+    await make_user()
+    monkeypatch.setattr(login_limiter, "ip", Rule("ip", 2, 60.0))
+
+    assert (await attempt(client)).status_code == 401
+    assert (await attempt(client)).status_code == 401
+    response = await attempt(client)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+
+async def test_failures_lock_the_account_but_not_other_accounts(client, make_user, monkeypatch):
+    await make_user()
+    await make_user("other@example.com")
+    monkeypatch.setattr(login_limiter, "pair", Rule("pair", 2, 300.0))
+
+    for _ in range(2):
+        assert (await attempt(client)).status_code == 401
+    # Locked even with the right password
+    assert (await attempt(client, password="Passw0rd!test")).status_code == 429
+    assert (await attempt(client, password="Passw0rd!test", email="other@example.com")).status_code == 200
+
+
+async def test_forwarded_for_is_ignored_without_trusted_proxies(client, make_user, monkeypatch, caplog):
+    await make_user()
+    monkeypatch.setattr(login_limiter, "ip", Rule("ip", 1, 60.0))
+    monkeypatch.setattr("app.core.ratelimit._untrusted_forwarded_warned", False)
+
+    first = await client.post(
+        "/auth/login-json", json={"username": "user@example.com", "password": "x"},
+        headers={"X-Forwarded-For": "198.51.100.1"},
+    )
+    second = await client.post(
+        "/auth/login-json", json={"username": "user@example.com", "password": "x"},
+        headers={"X-Forwarded-For": "198.51.100.2"},
+    )
+    assert (first.status_code, second.status_code) == (401, 429)
+    assert "RATE_LIMIT_TRUSTED_PROXIES=0" in caplog.text
@@ -0,0 +1,51 @@
+# tests/test_refresh_tokens.py
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def refresh(client, token: str):
+    return await client.post("/auth/refresh", json={"refresh_token": token})
+
+
+async def test_rotation_replaces_the_token(client, make_user, login):
+    await make_user()
+    first = (await login())["refresh_token"]
+
+    response = await refresh(client, first)
+    assert response.status_code == 200
+    second = response.json()["refresh_token"]
+    assert second != first
+    assert (await refresh(client, second)).status_code == 200
+
+
+async def test_replaying_a_rotated_token_revokes_every_session(client, make_user, login):
+    await make_user()
+    rotated = (await login())["refresh_token"]
+    other_session = (await login())["refresh_token"]
+    successor = (await refresh(client, rotated)).json()["refresh_token"]
+
+    response = await refresh(client, rotated)
+    assert response.status_code == 401
+    assert "reuse" in response.json()["detail"]
+    assert (await refresh(client, successor)).status_code == 401
+    assert (await refresh(client, other_session)).status_code == 401
+
+
+async def test_logged_out_token_is_only_rejected(client, make_user, login):
+    await make_user()
+    logged_out = (await login())["refresh_token"]
+    other_session = (await login())["refresh_token"]
+
+    response = await client.post("/users/logout", json={"refresh_token": logged_out})
+    assert response.status_code == 204
+
+    response = await refresh(client, logged_out)
+    assert response.status_code == 401
+    assert "reuse" not in response.json()["detail"]
+    assert (await refresh(client, other_session)).status_code == 200
+
+
+async def test_unknown_token_is_rejected(client):
+    assert (await refresh(client, "not-a-token")).status_code == 401
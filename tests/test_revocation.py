@@ -0,0 +1,58 @@
+# tests/test_revocation.py
+
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.revocation import RevocationList
+
+pytestmark = pytest.mark.anyio
+
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def test_logout_revokes_the_access_token(client, make_user, login):
+    await make_user()
+    tokens = await login()
+    other = await login()
+    assert (await client.get("/users/me", headers=auth(tokens["access_token"]))).status_code == 200
+
+    response = await client.post(
+        "/users/logout", json={"refresh_token": tokens["refresh_token"]}, headers=auth(tokens["access_token"]),
+    )
+    assert response.status_code == 204
+    assert (await client.get("/users/me", headers=auth(tokens["access_token"]))).status_code == 401
+    # Only that token (jti); the user's other sessions keep working
+    assert (await client.get("/users/me", headers=auth(other["access_token"]))).status_code == 200
+
+
+@pytest.mark.parametrize("stateless", [False, True])
+async def test_token_version_bump_revokes_older_tokens(client, make_user, login, monkeypatch, stateless):
+    monkeypatch.setattr(settings, "stateless_auth", stateless)
+    await make_user()
+    old = (await login())["access_token"]
+
+    response = await client.patch("/users/me", json={"email": "renamed@example.com"}, headers=auth(old))
+    assert response.status_code == 200
+    assert (await client.get("/users/me", headers=auth(old))).status_code == 401
+    fresh = (await login("renamed@example.com"))["access_token"]
+    assert (await client.get("/users/me", headers=auth(fresh))).status_code == 200
+
+
+async def test_revocation_list_entries():
+    revocations = RevocationList(ttl=60, maxsize=10)
+    now = time.time()
+    revocations.add_jti("a", now + 60)
+    revocations.add_jti("expired", now - 1)
+    revocations.set_min_version(7, 3)
+
+    assert revocations.is_revoked({"jti": "a"}) == "jti"
+    assert revocations.is_revoked({"jti": "expired"}) is None
+    assert revocations.is_revoked({"uid": 7, "ver": 2}) == "version"
+    assert revocations.is_revoked({"uid": 7, "ver": 3}) is None
+    # A lower version published late never lowers the bar
+    revocations.set_min_version(7, 1)
+    assert revocations.is_revoked({"uid": 7, "ver": 2}) == "version"
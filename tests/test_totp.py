@@ -0,0 +1,57 @@
+# tests/test_totp.py
+
+import time
+
+import pyotp
+import pytest
+from sqlalchemy import update
+
+from app.core.totp import MemoryStepStore, TOTPVerifier
+from app.db.models import User
+from app.db.session import AsyncSessionLocal
+
+pytestmark = pytest.mark.anyio
+
+
+def current_code(secret: str) -> str:
+    # Not within the last two seconds of a step, so the code is still current when checked
+    remaining = 30 - time.time() % 30
+    if remaining < 2:
+        time.sleep(remaining)
+    return pyotp.TOTP(secret).now()
+
+
+async def test_code_is_accepted_once_per_user():
+    verifier = TOTPVerifier(MemoryStepStore(), cache_size=10)
+    secret = pyotp.random_base32()
+    code = current_code(secret)
+
+    assert await verifier.verify(1, secret, code)
+    assert not await verifier.verify(1, secret, code)
+    # Replay protection is per user
+    assert await verifier.verify(2, secret, code)
+
+
+async def test_wrong_and_malformed_codes_are_rejected():
+    verifier = TOTPVerifier(MemoryStepStore(), cache_size=10)
+    secret = pyotp.random_base32()
+    code = current_code(secret)
+    wrong = f"{(int(code) + 1) % 1000000:06d}"
+
+    assert not await verifier.verify(1, secret, wrong)
+    assert not await verifier.verify(1, secret, "12ab56")
+    assert not await verifier.verify(1, secret, "")
+    assert await verifier.verify(1, secret, code)
+
+
+async def test_login_rejects_a_replayed_code(client, make_user):
+    user = await make_user()
+    secret = pyotp.random_base32()
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(User).where(User.id == user.id).values(is_2fa_enabled=True, totp_secret=secret))
+        await session.commit()
+    body = {"username": "user@example.com", "password": "Passw0rd!test", "two_fa_code": current_code(secret)}
+
+    assert (await client.post("/auth/login-json", json=body)).status_code == 200
+    response = await client.post("/auth/login-json", json=body)
+    assert response.status_code == 401